@@ -64,6 +64,12 @@ app_license = "mit"
 # 	"Role": "home_page"
 # }
 
+# Page Renderers
+# --------------
+
+# serve the pre-rendered demo listings and sitemaps
+page_renderer = ["ml_modules.ml_modules.static_listing.PrecompressedPageRenderer"]
+
 # Generators
 # ----------
 
@@ -145,6 +151,17 @@ app_license = "mit"
 # 	}
 # }
 
+# Bulk Status Transitions
+# -----------------------
+# Called once per chunk by ml_modules.ml_modules.bulk_status.bulk_transition_status
+# with `doctype`, the target `status` and the transitioned `rows` (name, previous status, ...)
+
+demo_status_bulk_update = [
+	"ml_modules.ml_modules.caching.on_bulk_status_update",
+	"ml_modules.ml_modules.static_listing.on_bulk_status_update",
+	"ml_modules.ml_modules.change_log.on_bulk_status_update",
+]
+
 # Scheduled Tasks
 # ---------------
 
@@ -166,6 +183,18 @@ app_license = "mit"
 # 	],
 # }
 
+scheduler_events = {
+	"hourly": [
+		"ml_modules.ml_modules.static_listing.build_all_dirty_pages",
+		"ml_modules.ml_modules.snapshots.build_snapshots",
+	],
+	"daily": [
+		"ml_modules.ml_modules.model_serving.train_moto_type_model",
+		"ml_modules.ml_modules.description_store.delete_unreferenced_blobs",
+		"ml_modules.ml_modules.change_log.compact_change_log",
+	],
+}
+
 # Testing
 # -------
 
@@ -199,6 +228,9 @@ app_license = "mit"
 # before_request = ["ml_modules.utils.before_request"]
 # after_request = ["ml_modules.utils.after_request"]
 
+before_request = ["ml_modules.ml_modules.profiling.before_request"]
+after_request = ["ml_modules.ml_modules.profiling.after_request"]
+
 # Job Events
 # ----------
 # before_job = ["ml_modules.utils.before_job"]
@@ -0,0 +1,245 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+"""
+Declarative, cached aggregation queries over the demo doctypes
+
+`aggregate` takes group-by fields, filters, measures and an optional date bucket,
+checks every field against the doctype meta and compiles them into one parameterized
+GROUP BY query. The session user's User Permissions, `if_owner` restrictions and
+permission query conditions are added to the WHERE clause, as `frappe.get_list` does.
+
+Results are cached under a key built from the normalized spec, those permission
+conditions and the version of the doctype's cache tag, so users only share results
+when they see the same records, and every write to the doctype, which invalidates the
+tag through `ml_modules.ml_modules.caching`, drops its cached aggregates at once.
+
+Example:
+
+	aggregate(
+		"Moto Demo",
+		group_by=["moto_type"],
+		filters={"status": ["in", ["Active", "Completed"]]},
+		measures=["count", "avg:engine_capacity"],
+		date_bucket="month",
+	)
+"""
+
+import hashlib
+import json
+
+import frappe
+from frappe.model.db_query import DatabaseQuery
+
+from ml_modules.ml_modules.caching import get_tag_versions
+from ml_modules.ml_modules.utils import validate_demo_doctype
+
+AGGREGATE_FUNCTIONS = ("count", "sum", "avg", "min", "max")
+
+GROUPABLE_FIELDTYPES = ("Select", "Link", "Data", "Date", "Check", "Int")
+NUMERIC_FIELDTYPES = ("Float", "Int", "Currency", "Percent")
+DATE_FIELDTYPES = ("Date", "Datetime")
+
+# SQL expression of each date bucket, `{0}` is the quoted date column
+DATE_BUCKETS = {
+	"day": "DATE({0})",
+	"week": "DATE_SUB(DATE({0}), INTERVAL WEEKDAY({0}) DAY)",
+	"month": "DATE_FORMAT({0}, '%%Y-%%m-01')",
+	"quarter": "MAKEDATE(YEAR({0}), 1) + INTERVAL (QUARTER({0}) - 1) QUARTER",
+	"year": "DATE_FORMAT({0}, '%%Y-01-01')",
+}
+
+FILTER_OPERATORS = ("=", "!=", "<", ">", "<=", ">=", "like", "not like", "in", "not in", "between", "is")
+
+# cached results also expire on their own, in case an invalidation is lost
+CACHE_TTL = 6 * 60 * 60
+
+MAX_ROWS = 10000
+
+
+@frappe.whitelist()
+def aggregate(doctype, group_by=None, filters=None, measures=None, date_bucket=None, date_field="demo_date"):
+	"""Return aggregated rows of a demo doctype, served from the cache when possible"""
+	validate_demo_doctype(doctype)
+	frappe.has_permission(doctype, "report", throw=True)
+
+	spec = normalize_spec(doctype, group_by, filters, measures, date_bucket, date_field)
+	permission_condition = get_permission_condition(doctype)
+	key = _cache_key(doctype, spec, permission_condition)
+	rows = frappe.cache().get_value(key)
+	if rows is None:
+		rows = _run_query(*compile_query(doctype, spec, permission_condition))
+		frappe.cache().set_value(key, rows, expires_in_sec=CACHE_TTL)
+
+	return rows
+
+
+def normalize_spec(
+	doctype, group_by=None, filters=None, measures=None, date_bucket=None, date_field="demo_date"
+):
+	"""Parse and validate a request against the doctype meta into a canonical spec"""
+	meta = frappe.get_meta(doctype)
+
+	group_by = _parse_list(group_by, "group_by")
+	for fieldname in group_by:
+		_validate_field(meta, fieldname, GROUPABLE_FIELDTYPES)
+
+	parsed_measures = []
+	for measure in _parse_list(measures, "measures") or ["count"]:
+		function, _sep, fieldname = str(measure).partition(":")
+		if function not in AGGREGATE_FUNCTIONS:
+			frappe.throw(f"Invalid aggregate function {function}")
+		if function == "count" and not fieldname:
+			parsed_measures.append(["count", None])
+			continue
+		_validate_field(meta, fieldname, NUMERIC_FIELDTYPES)
+		parsed_measures.append([function, fieldname])
+
+	parsed_filters = []
+	for fieldname, condition in _filter_conditions(filters):
+		_validate_field(meta, fieldname)
+		if isinstance(condition, list | tuple) and len(condition) != 2:
+			frappe.throw(f"Filter on {fieldname} must be [operator, value]")
+		operator, value = condition if isinstance(condition, list | tuple) else ("=", condition)
+		operator = str(operator).lower()
+		if operator not in FILTER_OPERATORS:
+			frappe.throw(f"Invalid filter operator {operator}")
+		if operator in ("in", "not in", "between") and not isinstance(value, list | tuple):
+			frappe.throw(f"Filter {operator} on {fieldname} needs a list of values")
+		if operator == "between" and len(value) != 2:
+			frappe.throw(f"Filter between on {fieldname} needs exactly two values")
+		if operator == "is" and value not in ("set", "not set"):
+			frappe.throw(f"Filter is on {fieldname} must be 'set' or 'not set'")
+		parsed_filters.append(
+			[fieldname, operator, list(value) if isinstance(value, list | tuple) else value]
+		)
+
+	# canonical order, so equivalent requests share a cache key
+	parsed_filters.sort(key=lambda parsed: json.dumps(parsed, default=str))
+
+	if date_bucket:
+		if date_bucket not in DATE_BUCKETS:
+			frappe.throw(f"Invalid date bucket {date_bucket}")
+		_validate_field(meta, date_field, DATE_FIELDTYPES)
+
+	return {
+		"group_by": list(group_by),
+		"measures": parsed_measures,
+		"filters": parsed_filters,
+		"date_bucket": date_bucket or None,
+		"date_field": date_field if date_bucket else None,
+	}
+
+
+def get_permission_condition(doctype):
+	"""SQL condition limiting `doctype` to the records the session user may read"""
+	# `%` is escaped as the condition is part of a query run with values
+	return DatabaseQuery(doctype).build_match_conditions().replace("%", "%%")
+
+
+def compile_query(doctype, spec, permission_condition=None):
+	"""Compile a normalized spec into one parameterized query and its values"""
+	select, group = [], []
+
+	if spec["date_bucket"]:
+		select.append(f"{DATE_BUCKETS[spec['date_bucket']].format(_quote(spec['date_field']))} AS `bucket`")
+		group.append("`bucket`")
+
+	for fieldname in spec["group_by"]:
+		select.append(_quote(fieldname))
+		group.append(_quote(fieldname))
+
+	for function, fieldname in spec["measures"]:
+		if function == "count" and not fieldname:
+			select.append("COUNT(*) AS `count`")
+		else:
+			select.append(f"{function.upper()}({_quote(fieldname)}) AS `{function}_{fieldname}`")
+
+	conditions, values = [], {}
+	for index, (fieldname, operator, value) in enumerate(spec["filters"]):
+		column, param = _quote(fieldname), f"f{index}"
+		if operator == "is":
+			conditions.append(f"IFNULL({column}, '') {'!=' if value == 'set' else '='} ''")
+		elif operator == "between":
+			conditions.append(f"{column} BETWEEN %({param}_from)s AND %({param}_to)s")
+			values[f"{param}_from"], values[f"{param}_to"] = value
+		elif operator in ("in", "not in"):
+			conditions.append(f"{column} {operator.upper()} %({param})s")
+			values[param] = tuple(value) or ("",)
+		else:
+			conditions.append(f"{column} {operator.upper()} %({param})s")
+			values[param] = value
+
+	if permission_condition:
+		conditions.append(f"({permission_condition})")
+
+	query = f"SELECT {', '.join(select)} FROM `tab{doctype}`"
+	if conditions:
+		query += f" WHERE {' AND '.join(conditions)}"
+	if group:
+		query += f" GROUP BY {', '.join(group)} ORDER BY {', '.join(group)}"
+	query += f" LIMIT {MAX_ROWS}"
+
+	return query, values
+
+
+def _run_query(query, values):
+	# read from the primary: a result computed on a lagging replica would stay cached until the next write
+	return frappe.db.sql(query, values, as_dict=True)
+
+
+def _cache_key(doctype, spec, permission_condition=None):
+	(version,) = get_tag_versions((doctype,))
+	scope = [spec, permission_condition or ""]
+	digest = hashlib.sha1(json.dumps(scope, sort_keys=True, default=str).encode()).hexdigest()
+	return f"ml_modules:aggregate:{doctype}:{version}:{digest}"
+
+
+def _parse_list(value, argument):
+	"""A JSON list, or a single value passed as a plain string"""
+	if not value:
+		return []
+	if isinstance(value, str) and not value.lstrip().startswith("["):
+		return [value.strip()]
+
+	value = _parse_json(value, argument)
+	if not isinstance(value, list | tuple):
+		frappe.throw(f"{argument} must be a list")
+	return list(value)
+
+
+def _filter_conditions(filters):
+	"""(fieldname, condition) pairs from a dict or Frappe's list form"""
+	filters = _parse_json(filters, "filters") if filters else {}
+
+	if isinstance(filters, dict):
+		pairs = list(filters.items())
+	elif isinstance(filters, list | tuple):
+		pairs = []
+		for item in filters:
+			# [fieldname, operator, value], optionally preceded by the doctype
+			if not isinstance(item, list | tuple) or len(item) not in (3, 4):
+				frappe.throw(f"Invalid filter {item}")
+			fieldname, operator, value = item[-3:]
+			pairs.append((fieldname, [operator, value]))
+	else:
+		frappe.throw("filters must be a dict or a list of [fieldname, operator, value]")
+
+	return pairs
+
+
+def _parse_json(value, argument):
+	try:
+		return frappe.parse_json(value)
+	except ValueError:
+		frappe.throw(f"{argument} is not valid JSON")
+
+
+def _validate_field(meta, fieldname, fieldtypes=None):
+	df = meta.get_field(fieldname) if isinstance(fieldname, str) else None
+	if not df or (fieldtypes and df.fieldtype not in fieldtypes):
+		frappe.throw(f"Cannot aggregate {meta.name} on field {fieldname}")
+
+
+def _quote(fieldname):
+	return f"`{fieldname}`"
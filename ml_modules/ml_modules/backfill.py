@@ -0,0 +1,278 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+"""
+Resumable backfills over the demo doctypes
+
+`run_backfill` splits a table into keyset ranges on `name` and calls a function once
+per range with the names it contains:
+
+	def fix_titles(doctype, names, dry_run=False):
+		...
+		return number_of_changed_records
+
+Progress is checkpointed per chunk in a Demo Backfill Job, so an interrupted run picks
+up where it stopped when started again with the same job name. Chunks run inline, in
+a process pool (`workers`) or on background workers (`queue`), and are throttled with a
+pause between chunks and an optional wait while the read replica lags.
+
+From the command line:
+
+	bench --site mysite execute ml_modules.ml_modules.backfill.run_backfill \\
+		--kwargs "{'doctype': 'Moto Demo', 'method': 'myapp.fixes.fix_titles', 'workers': 4}"
+
+From a patch listed in patches.txt:
+
+	def execute():
+		run_backfill("Moto Demo", "myapp.fixes.fix_titles")
+"""
+
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import frappe
+from frappe.utils import cint, flt
+
+from ml_modules.ml_modules.replica import get_replica_lag
+from ml_modules.ml_modules.utils import validate_demo_doctype
+
+DEFAULT_CHUNK_SIZE = 500
+
+# seconds between replica lag checks while waiting for it to catch up
+LAG_POLL_INTERVAL = 1
+
+
+def run_backfill(
+	doctype,
+	method,
+	job_name=None,
+	chunk_size=DEFAULT_CHUNK_SIZE,
+	dry_run=False,
+	workers=0,
+	queue=None,
+	throttle_seconds=0,
+	max_replica_lag=None,
+	restart=False,
+):
+	"""
+	Run `method` over every record of `doctype`, one keyset chunk at a time
+
+	Dry runs call `method` with `dry_run=True`, roll back every chunk and do not
+	checkpoint anything. Otherwise the run resumes the existing job of the same
+	name unless `restart` is set.
+	"""
+	validate_demo_doctype(doctype)
+	frappe.get_attr(method)
+	chunk_size = cint(chunk_size) or DEFAULT_CHUNK_SIZE
+
+	if dry_run:
+		return _dry_run(doctype, method, chunk_size)
+
+	job = _get_or_plan_job(job_name or f"{doctype}: {method}", doctype, method, chunk_size, restart)
+	pending = [chunk.idx for chunk in job.chunks if chunk.status != "Done"]
+	job.db_set("status", "Running" if pending else "Completed", commit=True)
+	options = {"throttle_seconds": flt(throttle_seconds), "max_replica_lag": max_replica_lag}
+
+	if queue:
+		for idx in pending:
+			frappe.enqueue(
+				"ml_modules.ml_modules.backfill.run_chunk",
+				queue=queue,
+				job_id=f"ml_modules_backfill::{job.name}::{idx}",
+				deduplicate=True,
+				enqueue_after_commit=True,
+				now=frappe.flags.in_test,
+				backfill_job=job.name,
+				idx=idx,
+				**options,
+			)
+		frappe.db.commit()
+		return {"job": job.name, "queued_chunks": len(pending)}
+
+	if cint(workers) > 1:
+		context = multiprocessing.get_context("spawn")
+		with ProcessPoolExecutor(
+			max_workers=cint(workers),
+			mp_context=context,
+			initializer=_init_worker,
+			initargs=(frappe.local.site, frappe.local.sites_path, frappe.session.user),
+		) as pool:
+			futures = [pool.submit(_run_chunk_in_worker, job.name, idx, options) for idx in pending]
+			for future in futures:
+				future.result()
+	else:
+		for idx in pending:
+			run_chunk(job.name, idx, **options)
+
+	return get_progress(job.name)
+
+
+def run_chunk(backfill_job, idx, throttle_seconds=0, max_replica_lag=None):
+	"""Process one chunk of a backfill job and checkpoint it; safe to call again for a done chunk"""
+	# single rows only, the job document holds every chunk of the table
+	job = frappe.db.get_value("Demo Backfill Job", backfill_job, ["document_type", "method"], as_dict=True)
+	chunk = frappe.db.get_value(
+		"Demo Backfill Chunk",
+		{"parent": backfill_job, "parenttype": "Demo Backfill Job", "idx": cint(idx)},
+		["name", "status", "start_after", "end_at"],
+		as_dict=True,
+	)
+	if chunk.status == "Done":
+		return
+
+	names = _get_chunk_names(job.document_type, chunk.start_after, chunk.end_at)
+	start = time.monotonic()
+	try:
+		changed = frappe.get_attr(job.method)(doctype=job.document_type, names=names, dry_run=False)
+		frappe.db.commit()
+	except Exception:
+		frappe.db.rollback()
+		frappe.db.set_value("Demo Backfill Chunk", chunk.name, "status", "Failed")
+		frappe.db.set_value(
+			"Demo Backfill Job", backfill_job, {"status": "Failed", "last_error": frappe.get_traceback()}
+		)
+		frappe.db.commit()
+		raise
+
+	frappe.db.set_value(
+		"Demo Backfill Chunk",
+		chunk.name,
+		{
+			"status": "Done",
+			"rows": len(names),
+			"changed": cint(changed),
+			"duration": time.monotonic() - start,
+		},
+	)
+	frappe.db.sql(
+		"""
+		UPDATE `tabDemo Backfill Job`
+		SET completed_chunks = completed_chunks + 1,
+			rows_processed = rows_processed + %(rows)s,
+			rows_changed = rows_changed + %(changed)s,
+			status = IF(completed_chunks >= total_chunks, 'Completed', status)
+		WHERE name = %(job)s
+	""",
+		{"rows": len(names), "changed": cint(changed), "job": backfill_job},
+	)
+	frappe.db.commit()
+
+	_throttle(throttle_seconds, max_replica_lag)
+
+
+def get_progress(job_name):
+	"""Return the progress counters of a backfill job"""
+	return frappe.db.get_value(
+		"Demo Backfill Job",
+		job_name,
+		["name", "status", "total_chunks", "completed_chunks", "rows_processed", "rows_changed"],
+		as_dict=True,
+	)
+
+
+def plan_chunks(doctype, chunk_size):
+	"""
+	Return keyset ranges (start_after, end_at] covering `doctype`
+
+	Each boundary is found with one index-only seek, so planning does not read
+	the rows themselves. The last range is open-ended so records inserted
+	while the backfill runs are still covered.
+	"""
+	ranges = []
+	start_after = ""
+	while True:
+		end_at = frappe.db.sql(
+			f"""
+			SELECT name FROM `tab{doctype}`
+			WHERE name > %s
+			ORDER BY name
+			LIMIT 1 OFFSET %s
+		""",
+			(start_after, chunk_size - 1),
+		)
+		if not end_at:
+			ranges.append((start_after, None))
+			return ranges
+
+		ranges.append((start_after, end_at[0][0]))
+		start_after = end_at[0][0]
+
+
+def _get_or_plan_job(job_name, doctype, method, chunk_size, restart):
+	if frappe.db.exists("Demo Backfill Job", job_name):
+		if not restart:
+			return frappe.get_doc("Demo Backfill Job", job_name)
+		frappe.delete_doc("Demo Backfill Job", job_name, ignore_permissions=True)
+
+	job = frappe.get_doc(
+		{
+			"doctype": "Demo Backfill Job",
+			"job_name": job_name,
+			"document_type": doctype,
+			"method": method,
+			"chunk_size": chunk_size,
+			"chunks": [
+				{"start_after": start_after, "end_at": end_at}
+				for start_after, end_at in plan_chunks(doctype, chunk_size)
+			],
+		}
+	)
+	job.total_chunks = len(job.chunks)
+	job.insert(ignore_permissions=True)
+	frappe.db.commit()
+	return job
+
+
+def _dry_run(doctype, method, chunk_size):
+	summary = {"dry_run": True, "chunks": 0, "rows_processed": 0, "rows_changed": 0}
+	for start_after, end_at in plan_chunks(doctype, chunk_size):
+		names = _get_chunk_names(doctype, start_after, end_at)
+		try:
+			changed = frappe.get_attr(method)(doctype=doctype, names=names, dry_run=True)
+		finally:
+			frappe.db.rollback()
+
+		summary["chunks"] += 1
+		summary["rows_processed"] += len(names)
+		summary["rows_changed"] += cint(changed)
+
+	return summary
+
+
+def _get_chunk_names(doctype, start_after, end_at):
+	upper_bound = "AND name <= %(end_at)s" if end_at else ""
+	return frappe.db.sql_list(
+		f"""
+		SELECT name FROM `tab{doctype}`
+		WHERE name > %(start_after)s {upper_bound}
+		ORDER BY name
+	""",
+		{"start_after": start_after or "", "end_at": end_at},
+	)
+
+
+def _throttle(throttle_seconds, max_replica_lag):
+	"""Protect the primary: pause between chunks and wait for a lagging replica"""
+	if throttle_seconds:
+		time.sleep(flt(throttle_seconds))
+
+	if max_replica_lag is None or not frappe.conf.read_from_replica:
+		return
+
+	# an unreachable replica says nothing about the load on the primary, so it is not waited for
+	while True:
+		lag = get_replica_lag()
+		if lag is None or lag <= flt(max_replica_lag):
+			return
+		time.sleep(LAG_POLL_INTERVAL)
+
+
+def _init_worker(site, sites_path, user):
+	frappe.init(site=site, sites_path=sites_path)
+	frappe.connect()
+	frappe.set_user(user)
+
+
+def _run_chunk_in_worker(backfill_job, idx, options):
+	run_chunk(backfill_job, idx, **options)
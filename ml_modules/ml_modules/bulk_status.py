@@ -0,0 +1,189 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+"""
+Set-based status transitions for the demo doctypes
+
+Moving thousands of records one `save()` at a time runs the controller hooks and
+writes a Version row per record. `bulk_transition_status` instead checks the allowed
+transitions for a whole chunk, applies them with a single UPDATE and sends the
+side effects out once per chunk:
+
+- Version rows are bulk inserted
+- the per-user counts and recent-activity index are adjusted by the aggregate delta
+- methods listed under the `demo_status_bulk_update` hook are called with the chunk
+
+Per-document controller hooks (`validate`, `on_update`, ...) are not run.
+"""
+
+import json
+from collections import Counter
+from functools import partial
+
+import frappe
+from frappe.utils import cint, get_datetime, now
+
+from ml_modules.ml_modules import user_activity
+from ml_modules.ml_modules.replica import pin_session_to_primary
+from ml_modules.ml_modules.utils import validate_demo_doctype
+
+# statuses each status may move to
+STATUS_TRANSITIONS = {
+	# the list views' "Mark as Completed" action has always completed drafts
+	"Draft": ("Active", "Inactive", "Completed"),
+	"Active": ("Inactive", "Completed"),
+	"Inactive": ("Active", "Completed"),
+	"Completed": (),
+}
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+@frappe.whitelist()
+def bulk_transition_status(doctype, status, names=None, filters=None, chunk_size=DEFAULT_CHUNK_SIZE):
+	"""
+	Move the matching records of a demo doctype to `status`
+
+	Takes either a list of `names` or `filters`. Records whose current status
+	cannot move to `status` are skipped, records outside the user's User Permissions
+	are left out. Each chunk is committed separately.
+	"""
+	validate_demo_doctype(doctype)
+	frappe.has_permission(doctype, "write", throw=True)
+
+	if status not in STATUS_TRANSITIONS:
+		frappe.throw(f"Invalid status {status}")
+
+	names = frappe.parse_json(names) if names else None
+	filters = frappe.parse_json(filters) if filters else None
+	if not names and filters is None:
+		frappe.throw("Either names or filters are required")
+
+	allowed_from = tuple(current for current, targets in STATUS_TRANSITIONS.items() if status in targets)
+	chunk_size = cint(chunk_size) or DEFAULT_CHUNK_SIZE
+
+	updated = skipped = 0
+	for rows in _iter_chunks(doctype, names, filters, chunk_size):
+		movable = [row for row in rows if row.status in allowed_from]
+		skipped += len(rows) - len(movable)
+		if movable:
+			updated += _transition_chunk(doctype, status, movable, allowed_from)
+		frappe.db.commit()
+
+	if updated:
+		pin_session_to_primary()
+		frappe.publish_realtime("list_update", {"doctype": doctype, "name": None})
+
+	return {"status": status, "updated": updated, "skipped": skipped}
+
+
+def _iter_chunks(doctype, names, filters, chunk_size):
+	"""
+	Yield locked rows of the matching records, `chunk_size` at a time in name order
+
+	`get_list` applies the User Permissions and permission query conditions of the
+	session user, so records they may not see are left out.
+	"""
+	fields = ["name", "status", "created_by_user", "modified_by_user"]
+
+	if names:
+		names = sorted(set(names))
+		for start in range(0, len(names), chunk_size):
+			yield frappe.get_list(
+				doctype,
+				filters={"name": ("in", names[start : start + chunk_size])},
+				fields=fields,
+				for_update=True,
+			)
+		return
+
+	filters = _as_filter_list(filters)
+	last_name = ""
+	while True:
+		rows = frappe.get_list(
+			doctype,
+			filters=[*filters, ["name", ">", last_name]],
+			fields=fields,
+			order_by="name asc",
+			limit=chunk_size,
+			for_update=True,
+		)
+		if not rows:
+			return
+
+		yield rows
+		last_name = rows[-1].name
+
+
+def _transition_chunk(doctype, status, rows, allowed_from):
+	"""Apply the transition to `rows` with one UPDATE and queue the batched side effects"""
+	timestamp = now()
+	user = frappe.session.user
+	names = tuple(row.name for row in rows)
+
+	frappe.db.sql(
+		f"""
+		UPDATE `tab{doctype}`
+		SET status = %(status)s, modified = %(modified)s, modified_by = %(user)s, modified_by_user = %(user)s
+		WHERE name IN %(names)s AND status IN %(allowed_from)s
+	""",
+		{"status": status, "modified": timestamp, "user": user, "names": names, "allowed_from": allowed_from},
+	)
+
+	for name in names:
+		frappe.clear_document_cache(doctype, name)
+
+	_insert_versions(doctype, status, rows, timestamp, user)
+
+	deltas = Counter()
+	for row in rows:
+		deltas[(row.created_by_user, row.status)] -= 1
+		deltas[(row.created_by_user, status)] += 1
+
+	score = get_datetime(timestamp).timestamp()
+	touched = [(user, name, score) for name in names]
+	frappe.db.after_commit.add(partial(user_activity.apply_activity, doctype, deltas, touched))
+
+	for method in frappe.get_hooks("demo_status_bulk_update"):
+		frappe.get_attr(method)(doctype=doctype, status=status, rows=rows)
+
+	return len(rows)
+
+
+def _insert_versions(doctype, status, rows, timestamp, user):
+	"""Write the audit trail of a chunk with one multi-row INSERT"""
+	values = []
+	for row in rows:
+		changed = [["status", row.status, status]]
+		if row.modified_by_user != user:
+			changed.append(["modified_by_user", row.modified_by_user, user])
+
+		data = {"added": [], "changed": changed, "removed": [], "row_changed": []}
+		values.append(
+			(
+				frappe.generate_hash(length=10),
+				timestamp,
+				timestamp,
+				user,
+				user,
+				doctype,
+				row.name,
+				json.dumps(data),
+			)
+		)
+
+	frappe.db.bulk_insert(
+		"Version",
+		fields=["name", "creation", "modified", "owner", "modified_by", "ref_doctype", "docname", "data"],
+		values=values,
+	)
+
+
+def _as_filter_list(filters):
+	if isinstance(filters, dict):
+		return [
+			[key, *value] if isinstance(value, list | tuple) else [key, "=", value]
+			for key, value in filters.items()
+		]
+
+	return list(filters or [])
@@ -0,0 +1,193 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+"""
+Shared result cache for read-only ML Modules functions
+
+`swr_cache` caches the result of a function per set of arguments in Redis:
+
+	@frappe.whitelist()
+	@swr_cache(ttl=60, stale_ttl=600, tags=("Moto Demo",))
+	@replica_read()
+	def get_moto_stats():
+		...
+
+- A result younger than `ttl` seconds is returned as is.
+- A result older than that but younger than `ttl + stale_ttl` is returned while one
+  background job computes a fresh one (stale-while-revalidate).
+- Without a result, one caller computes it under a lock shared by all workers and
+  concurrent callers wait for it instead of running the same queries (single flight).
+
+Results are shared between users, so only functions whose result does not depend on
+the session user can be cached. Every cache key includes the current version of its
+tags; `invalidate_tags` replaces those versions after commit, which drops every result
+cached under them at once. The demo controllers invalidate their doctype's tag.
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import time
+from functools import partial
+
+import frappe
+
+DEFAULT_TTL = 60
+DEFAULT_STALE_TTL = 10 * 60
+
+# seconds a computation may hold the lock; waiting callers give up after as long
+DEFAULT_LOCK_TIMEOUT = 30
+WAIT_INTERVAL = 0.05
+
+# deletes the lock only if it still belongs to the caller
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+	return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def swr_cache(ttl=DEFAULT_TTL, stale_ttl=DEFAULT_STALE_TTL, tags=(), lock_timeout=DEFAULT_LOCK_TIMEOUT):
+	"""Cache the result of the decorated function, see the module docstring"""
+
+	def decorator(fn):
+		signature = inspect.signature(fn)
+		method = f"{fn.__module__}.{fn.__qualname__}"
+
+		@functools.wraps(fn)
+		def wrapper(*args, **kwargs):
+			bound = signature.bind(*args, **kwargs)
+			bound.apply_defaults()
+			arguments = dict(bound.arguments)
+			key = _entry_key(method, arguments, tags)
+
+			entry = _get_entry(key)
+			if entry and time.time() < entry["fresh_until"]:
+				return entry["value"]
+
+			if entry:
+				token = _acquire_lock(key, lock_timeout)
+				if token:
+					_enqueue_refresh(method, arguments, key, token)
+				return entry["value"]
+
+			return _compute_single_flight(wrapper, arguments, key)
+
+		wrapper.uncached = fn
+		wrapper.cache_options = frappe._dict(
+			ttl=ttl, stale_ttl=stale_ttl, tags=tags, lock_timeout=lock_timeout
+		)
+		return wrapper
+
+	return decorator
+
+
+def invalidate_tags(*tags):
+	"""Drop every result cached under `tags` once the current transaction commits"""
+	frappe.db.after_commit.add(partial(_new_tag_versions, tags))
+
+
+def get_tag_versions(tags):
+	"""Return the current version of each tag, for keys of caches outside `swr_cache`"""
+	return [frappe.cache().get_value(_tag_key(tag)) or "0" for tag in tags]
+
+
+def on_bulk_status_update(doctype, status, rows):
+	"""demo_status_bulk_update hook"""
+	invalidate_tags(doctype)
+
+
+def refresh(fn_path, arguments, key, token):
+	"""Background job recomputing a stale result"""
+	wrapper = frappe.get_attr(fn_path)
+	try:
+		_compute_and_store(wrapper, arguments, key)
+	finally:
+		_release_lock(key, token)
+
+
+def _compute_single_flight(wrapper, arguments, key):
+	lock_timeout = wrapper.cache_options.lock_timeout
+	token = _acquire_lock(key, lock_timeout)
+	if not token:
+		deadline = time.monotonic() + lock_timeout
+		while time.monotonic() < deadline:
+			time.sleep(WAIT_INTERVAL)
+			entry = _get_entry(key)
+			if entry:
+				return entry["value"]
+		# the computation holding the lock did not finish in time, do not wait any longer
+
+	try:
+		return _compute_and_store(wrapper, arguments, key)
+	finally:
+		if token:
+			_release_lock(key, token)
+
+
+def _compute_and_store(wrapper, arguments, key):
+	options = wrapper.cache_options
+	value = wrapper.uncached(**arguments)
+	frappe.cache().set_value(
+		key,
+		{"value": value, "fresh_until": time.time() + options.ttl},
+		expires_in_sec=options.ttl + options.stale_ttl,
+	)
+	return value
+
+
+def _enqueue_refresh(method, arguments, key, token):
+	try:
+		frappe.enqueue(
+			"ml_modules.ml_modules.caching.refresh",
+			queue="short",
+			now=frappe.flags.in_test,
+			fn_path=method,
+			arguments=arguments,
+			key=key,
+			token=token,
+		)
+	except Exception:
+		# the stale result is still served, the next caller retries the refresh
+		_release_lock(key, token)
+		frappe.log_error(f"Could not enqueue the refresh of {method}")
+
+
+def _get_entry(key):
+	# `expires` keeps the miss out of the per-request local cache, so waiting callers see the result
+	return frappe.cache().get_value(key, expires=True)
+
+
+def _acquire_lock(key, lock_timeout):
+	token = frappe.generate_hash(length=10)
+	cache = frappe.cache()
+	acquired = (
+		cache.pipeline().set(cache.make_key(_lock_key(key)), token, nx=True, ex=lock_timeout).execute()[0]
+	)
+	return token if acquired else None
+
+
+def _release_lock(key, token):
+	cache = frappe.cache()
+	cache.eval(RELEASE_LOCK_SCRIPT, 1, cache.make_key(_lock_key(key)), token)
+
+
+def _new_tag_versions(tags):
+	for tag in tags:
+		frappe.cache().set_value(_tag_key(tag), frappe.generate_hash(length=10))
+
+
+def _entry_key(method, arguments, tags):
+	versions = ":".join(get_tag_versions(tags))
+	digest = hashlib.sha1(json.dumps(arguments, sort_keys=True, default=str).encode()).hexdigest()
+	return f"ml_modules:swr:{method}:{versions}:{digest}"
+
+
+def _lock_key(key):
+	return f"{key}:lock"
+
+
+def _tag_key(tag):
+	return f"ml_modules:cache_tag:{tag}"
@@ -0,0 +1,248 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+"""
+Change-data-capture feed of the demo doctypes
+
+Every insert, update, delete and rename of a demo appends a Demo Change Log entry in
+the same transaction. The autoincrement name of the entry is its sequence number and
+`data` holds the changed fields with their new values (all fields for an insert).
+The description body is not copied: its `description_hash` is, and the body is
+available through `ml_modules.ml_modules.description_store.get_description`.
+
+Consumers keep the last sequence they processed and pull what follows:
+
+	cursor = 0
+	while True:
+		page = get_changes(since=cursor)
+		apply(page["changes"])
+		cursor = page["cursor"]
+		if not page["has_more"]:
+			break
+
+Sequence numbers are handed out at insert time but become visible at commit, so an
+entry can show up after a higher one. Entries younger than
+`ml_modules_change_log_visibility_lag` seconds (default 10) are therefore held back.
+
+`compact_change_log` removes entries older than `ml_modules_change_log_retention_days`
+(default 30). A consumer whose cursor points before the removed range gets
+`resync_required` and has to reload the tables before following the feed again.
+"""
+
+import json
+
+import frappe
+from frappe.model import no_value_fields
+from frappe.utils import add_days, add_to_date, cint, now, now_datetime
+
+from ml_modules.ml_modules.utils import validate_demo_doctype
+
+OPERATION_INSERT = "Insert"
+OPERATION_UPDATE = "Update"
+OPERATION_DELETE = "Delete"
+OPERATION_RENAME = "Rename"
+
+# large bodies are referenced through their hash instead
+EXCLUDED_FIELDS = ("description",)
+
+DEFAULT_VISIBILITY_LAG = 10
+DEFAULT_RETENTION_DAYS = 30
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+# rows deleted per statement by the compaction, to keep locks short
+COMPACTION_BATCH_SIZE = 10000
+
+TRUNCATED_AT_KEY = "ml_modules_change_log_truncated_at"
+
+
+def on_demo_insert(doc):
+	"""Log a new demo with all its fields"""
+	_log(
+		doc.doctype,
+		doc.name,
+		OPERATION_INSERT,
+		{
+			fieldname: value
+			for fieldname in _tracked_fields(doc.doctype)
+			if (value := doc.get(fieldname)) is not None
+		},
+	)
+
+
+def on_demo_update(doc):
+	"""Log the fields a save changed; the insert itself is logged by `on_demo_insert`"""
+	before = doc.get_doc_before_save()
+	if doc.flags.in_insert or not before:
+		return
+
+	changed = {
+		fieldname: doc.get(fieldname)
+		for fieldname in _tracked_fields(doc.doctype)
+		if doc.get(fieldname) != before.get(fieldname)
+	}
+	if changed:
+		_log(doc.doctype, doc.name, OPERATION_UPDATE, changed)
+
+
+def on_demo_trash(doc):
+	"""Log a deleted demo"""
+	_log(doc.doctype, doc.name, OPERATION_DELETE)
+
+
+def on_demo_rename(doc, old_name, new_name, merge=False):
+	"""Log a renamed demo, `merge` meaning it was merged into the existing `new_name`"""
+	_log(doc.doctype, new_name, OPERATION_RENAME, {"merge": 1} if merge else None, old_name=old_name)
+
+
+def on_bulk_status_update(doctype, status, rows):
+	"""demo_status_bulk_update hook, logs the chunk with one multi-row INSERT"""
+	timestamp, user = now(), frappe.session.user
+	frappe.db.bulk_insert(
+		"Demo Change Log",
+		fields=[
+			"creation",
+			"modified",
+			"owner",
+			"modified_by",
+			"document_type",
+			"document_name",
+			"operation",
+			"data",
+		],
+		values=[
+			(
+				timestamp,
+				timestamp,
+				user,
+				user,
+				doctype,
+				row.name,
+				OPERATION_UPDATE,
+				_dumps({"status": status, "modified_by_user": user}),
+			)
+			for row in rows
+		],
+	)
+
+
+@frappe.whitelist()
+def get_changes(since=0, limit=DEFAULT_PAGE_SIZE, doctype=None):
+	"""
+	Return the changes after sequence `since`, oldest first
+
+	`cursor` is the sequence to pass as `since` for the next page and `has_more`
+	tells whether more entries were already available.
+	"""
+	frappe.has_permission("Demo Change Log", "read", throw=True)
+	if doctype:
+		validate_demo_doctype(doctype)
+
+	since = cint(since)
+	limit = min(cint(limit) or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+	doctype_condition = "AND document_type = %(doctype)s" if doctype else ""
+
+	rows = frappe.db.sql(
+		f"""
+		SELECT name, creation, document_type, document_name, operation, old_name, data
+		FROM `tabDemo Change Log`
+		WHERE name > %(since)s {doctype_condition}
+		ORDER BY name
+		LIMIT %(limit)s
+	""",
+		{"since": since, "doctype": doctype, "limit": limit + 1},
+		as_dict=True,
+	)
+
+	has_more = len(rows) > limit
+	rows = rows[:limit]
+
+	# stop at the first entry that may still have lower sequences committing around it
+	visible_until = add_to_date(
+		now_datetime(),
+		seconds=-cint(frappe.conf.get("ml_modules_change_log_visibility_lag", DEFAULT_VISIBILITY_LAG)),
+	)
+	for index, row in enumerate(rows):
+		if row.creation > visible_until:
+			rows, has_more = rows[:index], False
+			break
+
+	changes = [
+		{
+			"seq": cint(row.name),
+			"timestamp": row.creation,
+			"doctype": row.document_type,
+			"name": row.document_name,
+			"operation": row.operation,
+			"old_name": row.old_name,
+			"data": json.loads(row.data) if row.data else {},
+		}
+		for row in rows
+	]
+
+	return {
+		"changes": changes,
+		"cursor": changes[-1]["seq"] if changes else since,
+		"has_more": has_more,
+		"resync_required": since < cint(frappe.db.get_global(TRUNCATED_AT_KEY)),
+	}
+
+
+def compact_change_log():
+	"""Scheduled removal of the entries older than the retention period"""
+	retention_days = cint(frappe.conf.get("ml_modules_change_log_retention_days")) or DEFAULT_RETENTION_DAYS
+	cutoff = add_days(now_datetime(), -retention_days)
+
+	last_expired = frappe.db.sql(
+		"""
+		SELECT MAX(name) FROM `tabDemo Change Log`
+		WHERE creation < %s
+	""",
+		(cutoff,),
+	)[0][0]
+	if not last_expired:
+		return
+
+	# recorded first, so consumers are told to resync as soon as entries start disappearing
+	frappe.db.set_global(TRUNCATED_AT_KEY, last_expired)
+	frappe.db.commit()
+
+	while True:
+		frappe.db.sql(
+			"""
+			DELETE FROM `tabDemo Change Log`
+			WHERE name <= %s
+			ORDER BY name
+			LIMIT %s
+		""",
+			(last_expired, COMPACTION_BATCH_SIZE),
+		)
+		deleted = frappe.db.sql("SELECT ROW_COUNT()")[0][0]
+		frappe.db.commit()
+		if deleted < COMPACTION_BATCH_SIZE:
+			return
+
+
+def _log(doctype, name, operation, data=None, old_name=None):
+	frappe.get_doc(
+		{
+			"doctype": "Demo Change Log",
+			"document_type": doctype,
+			"document_name": name,
+			"operation": operation,
+			"old_name": old_name,
+			"data": _dumps(data) if data else None,
+		}
+	).insert(ignore_permissions=True)
+
+
+def _tracked_fields(doctype):
+	return [
+		df.fieldname
+		for df in frappe.get_meta(doctype).fields
+		if df.fieldtype not in no_value_fields and df.fieldname not in EXCLUDED_FIELDS
+	]
+
+
+def _dumps(data):
+	return json.dumps(data, default=str, sort_keys=True)
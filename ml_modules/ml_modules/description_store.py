@@ -0,0 +1,187 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+"""
+Compressed, deduplicated storage of demo descriptions
+
+The `description` column of the demo doctypes stays empty. Bodies are stored
+zlib-compressed in Demo Description Blob, named by the SHA-256 of the body, and the
+demo only keeps that hash in `description_hash`, so identical descriptions share one
+row.
+
+`CompressedDescriptionMixin` does the swap in `db_insert`/`db_update` and loads the
+body on first access of `doc.description`. Code reading the field through
+`doc.get("description")` on a freshly loaded document calls `doc.load_description()`
+first; `as_dict()` does it on its own, so form loads and API payloads are complete.
+
+Demos saved before this storage existed keep their plain column until they are saved
+again or the `compress_demo_descriptions` patch moves them.
+"""
+
+import base64
+import hashlib
+import zlib
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import add_days, now, now_datetime
+
+from ml_modules.ml_modules.utils import DEMO_DOCTYPES
+
+CODEC_ZLIB = "zlib"
+CODEC_NONE = "none"
+
+COMPRESSION_LEVEL = 6
+
+# unreferenced blobs are kept this long, so a save reusing one in a running transaction keeps it
+GC_GRACE_DAYS = 1
+
+
+class CompressedDescriptionMixin:
+	"""Stores `description` as a Demo Description Blob and loads it lazily"""
+
+	@property
+	def description(self):
+		self.load_description()
+		return self.__dict__.get("description")
+
+	@description.setter
+	def description(self, value):
+		self.__dict__["description"] = value
+		self.__dict__["_description_pending"] = False
+
+	def set(self, key, value, *args, **kwargs):
+		# `set` and `update` write to `__dict__` directly, without going through the property
+		if key == "description":
+			self.__dict__["_description_pending"] = False
+		return super().set(key, value, *args, **kwargs)
+
+	def load_from_db(self):
+		super().load_from_db()
+		# the column is empty when the body lives in a blob
+		self.__dict__["_description_pending"] = bool(
+			self.description_hash and not self.__dict__.get("description")
+		)
+		return self
+
+	def load_description(self):
+		"""Fetch the description body if it has not been loaded yet"""
+		if self.__dict__.get("_description_pending"):
+			self.__dict__["description"] = get_description(self.description_hash)
+			self.__dict__["_description_pending"] = False
+		return self.__dict__.get("description")
+
+	def load_doc_before_save(self, *args, **kwargs):
+		super().load_doc_before_save(*args, **kwargs)
+		# compare like with like in the Version diff
+		if not self.__dict__.get("_description_pending") and self.get_doc_before_save():
+			self.get_doc_before_save().load_description()
+
+	def as_dict(self, *args, **kwargs):
+		self.load_description()
+		return super().as_dict(*args, **kwargs)
+
+	def db_insert(self, *args, **kwargs):
+		with _description_moved_to_blob(self):
+			return super().db_insert(*args, **kwargs)
+
+	def db_update(self, *args, **kwargs):
+		with _description_moved_to_blob(self):
+			return super().db_update(*args, **kwargs)
+
+
+def store_description(body):
+	"""Store a description body and return its hash, reusing the existing blob of the same body"""
+	raw = body.encode()
+	digest = hashlib.sha256(raw).hexdigest()
+
+	compressed = zlib.compress(raw, COMPRESSION_LEVEL)
+	if len(compressed) < len(raw):
+		codec, stored = CODEC_ZLIB, base64.b64encode(compressed).decode()
+	else:
+		codec, stored = CODEC_NONE, body
+
+	timestamp, user = now(), frappe.session.user
+	frappe.db.sql(
+		"""
+		INSERT INTO `tabDemo Description Blob`
+			(name, codec, body, raw_size, stored_size, creation, modified, owner, modified_by)
+		VALUES (%(name)s, %(codec)s, %(body)s, %(raw_size)s, %(stored_size)s, %(now)s, %(now)s, %(user)s, %(user)s)
+		ON DUPLICATE KEY UPDATE modified = VALUES(modified)
+	""",
+		{
+			"name": digest,
+			"codec": codec,
+			"body": stored,
+			"raw_size": len(raw),
+			"stored_size": len(stored),
+			"now": timestamp,
+			"user": user,
+		},
+	)
+	return digest
+
+
+def get_description(description_hash):
+	"""Return the description body stored under `description_hash`"""
+	if not description_hash:
+		return None
+
+	blob = frappe.db.get_value("Demo Description Blob", description_hash, ["codec", "body"], as_dict=True)
+	if not blob:
+		return None
+
+	if blob.codec == CODEC_ZLIB:
+		return zlib.decompress(base64.b64decode(blob.body)).decode()
+	return blob.body
+
+
+def compress_descriptions(doctype, names, dry_run=False):
+	"""Backfill method moving plain description columns into blobs"""
+	rows = frappe.get_all(
+		doctype,
+		filters={"name": ["in", names], "description": ["is", "set"]},
+		fields=["name", "description"],
+	)
+	if dry_run:
+		return len(rows)
+
+	for row in rows:
+		frappe.db.set_value(
+			doctype,
+			row.name,
+			{"description": None, "description_hash": store_description(row.description)},
+			update_modified=False,
+		)
+	return len(rows)
+
+
+def delete_unreferenced_blobs():
+	"""Scheduled removal of blobs no demo points to any more"""
+	references = " ".join(
+		f"AND NOT EXISTS (SELECT 1 FROM `tab{doctype}` demo WHERE demo.description_hash = blob.name)"
+		for doctype in DEMO_DOCTYPES
+	)
+	frappe.db.sql(
+		f"""
+		DELETE blob FROM `tabDemo Description Blob` blob
+		WHERE blob.modified < %s {references}
+	""",
+		(add_days(now_datetime(), -GC_GRACE_DAYS),),
+	)
+	frappe.db.commit()
+
+
+@contextmanager
+def _description_moved_to_blob(doc):
+	"""Write the body to its blob and keep it out of the demo row for the duration of the write"""
+	body = doc.__dict__.get("description")
+	# a body on a document still waiting for its blob was written to `__dict__` directly
+	if body or not doc.__dict__.get("_description_pending"):
+		doc.description_hash = store_description(body) if body else None
+
+	doc.__dict__["description"] = None
+	try:
+		yield
+	finally:
+		doc.__dict__["description"] = body
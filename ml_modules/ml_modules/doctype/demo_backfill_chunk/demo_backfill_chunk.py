@@ -0,0 +1,13 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+from frappe.model.document import Document
+
+
+class DemoBackfillChunk(Document):
+	"""
+	Demo Backfill Chunk DocType Controller
+	A keyset range (start_after, end_at] of a Demo Backfill Job.
+	"""
+
+	pass
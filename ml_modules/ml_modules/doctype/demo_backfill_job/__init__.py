@@ -0,0 +1,2 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
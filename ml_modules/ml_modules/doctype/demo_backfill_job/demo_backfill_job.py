@@ -0,0 +1,13 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+from frappe.model.document import Document
+
+
+class DemoBackfillJob(Document):
+	"""
+	Demo Backfill Job DocType Controller
+	Checkpoint of a backfill run by ml_modules.ml_modules.backfill, one row per keyset chunk.
+	"""
+
+	pass
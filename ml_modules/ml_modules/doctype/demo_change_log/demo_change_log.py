@@ -0,0 +1,21 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class DemoChangeLog(Document):
+	"""
+	Demo Change Log DocType Controller
+	Append-only change feed of the demo doctypes, see ml_modules.ml_modules.change_log.
+	The autoincrement name is the sequence number consumers use as their cursor.
+	"""
+
+	pass
+
+
+def on_doctype_update():
+	"""Indexes for per-doctype pulls and the retention cleanup"""
+	frappe.db.add_index("Demo Change Log", ["document_type", "name"])
+	frappe.db.add_index("Demo Change Log", ["creation"])
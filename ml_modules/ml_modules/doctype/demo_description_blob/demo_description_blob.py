@@ -0,0 +1,13 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+from frappe.model.document import Document
+
+
+class DemoDescriptionBlob(Document):
+	"""
+	Demo Description Blob DocType Controller
+	Compressed demo description named by the SHA-256 of its body, see ml_modules.ml_modules.description_store.
+	"""
+
+	pass
@@ -58,6 +58,7 @@ function get_demo_info(frm) {
 		frappe.call({
 			method: 'get_demo_info',
 			doc: frm.doc,
+			args: {include_description: 1},
 			callback: function(r) {
 				if (r.message) {
 					frappe.msgprint({
@@ -2,10 +2,16 @@
 # For license information, please see license.txt
 
 import frappe
+from frappe.utils import cint
 from frappe.website.website_generator import WebsiteGenerator
 
+from ml_modules.ml_modules import caching, change_log, static_listing, user_activity
+from ml_modules.ml_modules.caching import swr_cache
+from ml_modules.ml_modules.description_store import CompressedDescriptionMixin
+from ml_modules.ml_modules.replica import pin_session_to_primary, replica_read
 
-class LamaaDemo(WebsiteGenerator):
+
+class LamaaDemo(CompressedDescriptionMixin, WebsiteGenerator):
 	"""
 	Lamaa Demo DocType Controller
 	This is a demo doctype created for testing purposes.
@@ -13,6 +19,7 @@ class LamaaDemo(WebsiteGenerator):
 
 	def validate(self):
 		"""Validate the document before saving"""
+		self.set_route()
 		self.set_created_by()
 		self.set_modified_by()
 
@@ -23,13 +30,28 @@ class LamaaDemo(WebsiteGenerator):
 
 	def after_insert(self):
 		"""Called after inserting the document"""
-		# Add any post-creation logic here
-		pass
+		change_log.on_demo_insert(self)
 
 	def on_update(self):
 		"""Called after updating the document"""
-		# Add any post-update logic here
-		pass
+		user_activity.on_demo_update(self)
+		caching.invalidate_tags(self.doctype)
+		static_listing.on_demo_update(self)
+		change_log.on_demo_update(self)
+		pin_session_to_primary()
+
+	def on_trash(self):
+		"""Called before deleting the document"""
+		super().on_trash()
+		user_activity.on_demo_trash(self)
+		caching.invalidate_tags(self.doctype)
+		static_listing.on_demo_trash(self)
+		change_log.on_demo_trash(self)
+
+	def after_rename(self, old_name, new_name, merge=False):
+		"""Called after renaming the document"""
+		static_listing.on_demo_rename(self, old_name, new_name)
+		change_log.on_demo_rename(self, old_name, new_name, merge)
 
 	def on_submit(self):
 		"""Called when document is submitted"""
@@ -51,19 +73,23 @@ class LamaaDemo(WebsiteGenerator):
 		self.modified_by_user = frappe.session.user
 
 	@frappe.whitelist()
-	def get_demo_info(self):
+	@replica_read()
+	def get_demo_info(self, include_description=0):
 		"""
 		Custom method to get demo information
 		This method can be called from the frontend
+		The description is only loaded and returned with `include_description`
 		"""
-		return {
+		info = {
 			"title": self.title,
 			"status": self.status,
 			"priority": self.priority,
-			"description": self.description,
 			"demo_date": self.demo_date,
 			"demo_time": self.demo_time
 		}
+		if cint(include_description):
+			info["description"] = self.description
+		return info
 
 	def get_context(self, context):
 		"""
@@ -74,6 +100,8 @@ class LamaaDemo(WebsiteGenerator):
 
 
 @frappe.whitelist()
+@swr_cache(ttl=60, tags=("Lamaa Demo",))
+@replica_read()
 def get_demo_stats():
 	"""
 	Global method to get demo statistics
@@ -102,3 +130,11 @@ def create_demo_record(title, description=None, priority="Medium"):
 	})
 	doc.insert()
 	return doc.name
+
+
+def on_doctype_update():
+	"""Indexes for the per-user views, the static listing pages and the description blob cleanup"""
+	frappe.db.add_index("Lamaa Demo", ["created_by_user", "status"])
+	frappe.db.add_index("Lamaa Demo", ["modified_by_user", "modified"])
+	frappe.db.add_index("Lamaa Demo", ["published", "creation"])
+	frappe.db.add_index("Lamaa Demo", ["description_hash"])
@@ -96,17 +96,19 @@ frappe.listview_settings['Lamaa Demo'] = {
 			label: __("Mark as Completed"),
 			action: function(docs) {
 				frappe.call({
-					method: "frappe.desk.bulk_update.bulk_update",
+					method: "ml_modules.ml_modules.bulk_status.bulk_transition_status",
 					args: {
 						doctype: "Lamaa Demo",
-						docs: docs,
-						update: {status: "Completed"}
+						status: "Completed",
+						names: docs.map(doc => doc.name || doc)
 					},
 					callback: function(r) {
 						if (!r.exc) {
 							frappe.show_alert({
-								message: __("Status updated for {0} records", [docs.length]),
-								indicator: "blue"
+								message: r.message.skipped
+									? __("Status updated for {0} records, {1} skipped", [r.message.updated, r.message.skipped])
+									: __("Status updated for {0} records", [r.message.updated]),
+								indicator: r.message.skipped ? "orange" : "blue"
 							});
 							cur_list.refresh();
 						}
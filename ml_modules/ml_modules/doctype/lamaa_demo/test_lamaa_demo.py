@@ -72,7 +72,7 @@ class TestLamaaDemo(FrappeTestCase):
 		doc.insert()
 
 		# Test get_demo_info method
-		info = doc.get_demo_info()
+		info = doc.get_demo_info(include_description=1)
 
 		self.assertEqual(info["title"], doc.title)
 		self.assertEqual(info["status"], "Active")
@@ -81,6 +81,9 @@ class TestLamaaDemo(FrappeTestCase):
 		self.assertEqual(info["demo_date"], "2024-01-15")
 		self.assertEqual(info["demo_time"], "10:30:00")
 
+		# The description is left out unless requested
+		self.assertNotIn("description", doc.get_demo_info())
+
 	def test_status_options(self):
 		"""Test that all status options work correctly"""
 		status_options = ["Draft", "Active", "Inactive", "Completed"]
@@ -73,6 +73,7 @@ function get_moto_info(frm) {
 		frappe.call({
 			method: 'get_moto_info',
 			doc: frm.doc,
+			args: {include_description: 1},
 			callback: function(r) {
 				if (r.message) {
 					frappe.msgprint({
@@ -2,10 +2,17 @@
 # For license information, please see license.txt
 
 import frappe
+from frappe.utils import cint
 from frappe.website.website_generator import WebsiteGenerator
 
+from ml_modules.ml_modules import caching, change_log, model_serving, static_listing, user_activity
+from ml_modules.ml_modules.caching import swr_cache
+from ml_modules.ml_modules.description_store import CompressedDescriptionMixin
+from ml_modules.ml_modules.replica import pin_session_to_primary, replica_read
+from ml_modules.ml_modules.utils import ENGINE_CAPACITY_RANGES
 
-class MotoDemo(WebsiteGenerator):
+
+class MotoDemo(CompressedDescriptionMixin, WebsiteGenerator):
 	"""
 	Moto Demo DocType Controller
 	This is a demo doctype for motorcycle demonstrations.
@@ -13,9 +20,11 @@ class MotoDemo(WebsiteGenerator):
 
 	def validate(self):
 		"""Validate the document before saving"""
+		self.set_route()
 		self.set_created_by()
 		self.set_modified_by()
 		self.validate_engine_capacity()
+		self.set_model_scores()
 
 	def before_save(self):
 		"""Called before saving the document"""
@@ -24,13 +33,28 @@ class MotoDemo(WebsiteGenerator):
 
 	def after_insert(self):
 		"""Called after inserting the document"""
-		# Add any post-creation logic here
-		pass
+		change_log.on_demo_insert(self)
 
 	def on_update(self):
 		"""Called after updating the document"""
-		# Add any post-update logic here
-		pass
+		user_activity.on_demo_update(self)
+		caching.invalidate_tags(self.doctype)
+		static_listing.on_demo_update(self)
+		change_log.on_demo_update(self)
+		pin_session_to_primary()
+
+	def on_trash(self):
+		"""Called before deleting the document"""
+		super().on_trash()
+		user_activity.on_demo_trash(self)
+		caching.invalidate_tags(self.doctype)
+		static_listing.on_demo_trash(self)
+		change_log.on_demo_trash(self)
+
+	def after_rename(self, old_name, new_name, merge=False):
+		"""Called after renaming the document"""
+		static_listing.on_demo_rename(self, old_name, new_name)
+		change_log.on_demo_rename(self, old_name, new_name, merge)
 
 	def on_submit(self):
 		"""Called when document is submitted"""
@@ -59,22 +83,39 @@ class MotoDemo(WebsiteGenerator):
 		if self.moto_type == "Scooter" and self.engine_capacity and self.engine_capacity > 300:
 			frappe.throw("Scooters typically have engine capacity under 300cc")
 
+	def set_model_scores(self):
+		"""Flag unusual engine capacities and suggest a motorcycle type when it is missing"""
+		result = model_serving.score_record(self.moto_type, self.engine_capacity)
+		self.capacity_anomaly_score = result.anomaly_score
+		self.suggested_moto_type = result.suggested_moto_type
+
+		if result.is_anomaly:
+			frappe.msgprint(
+				f"Engine capacity {self.engine_capacity}cc is unusual for a {self.moto_type} motorcycle",
+				indicator="orange",
+				alert=True
+			)
+
 	@frappe.whitelist()
-	def get_moto_info(self):
+	@replica_read()
+	def get_moto_info(self, include_description=0):
 		"""
 		Custom method to get motorcycle demo information
 		This method can be called from the frontend
+		The description is only loaded and returned with `include_description`
 		"""
-		return {
+		info = {
 			"title": self.title,
 			"status": self.status,
 			"priority": self.priority,
-			"description": self.description,
 			"demo_date": self.demo_date,
 			"demo_time": self.demo_time,
 			"moto_type": self.moto_type,
 			"engine_capacity": self.engine_capacity
 		}
+		if cint(include_description):
+			info["description"] = self.description
+		return info
 
 	def get_context(self, context):
 		"""
@@ -85,6 +126,8 @@ class MotoDemo(WebsiteGenerator):
 
 
 @frappe.whitelist()
+@swr_cache(ttl=60, tags=("Moto Demo",))
+@replica_read()
 def get_moto_stats():
 	"""
 	Global method to get motorcycle demo statistics
@@ -127,18 +170,17 @@ def create_moto_record(title, description=None, priority="Medium", moto_type=Non
 
 
 @frappe.whitelist()
+@swr_cache(ttl=24 * 60 * 60)
 def get_engine_capacity_range(moto_type):
 	"""
 	Get typical engine capacity range for a motorcycle type
 	"""
-	capacity_ranges = {
-		"Sport": {"min": 250, "max": 1000, "typical": "600-1000cc"},
-		"Cruiser": {"min": 500, "max": 1800, "typical": "800-1600cc"},
-		"Touring": {"min": 800, "max": 1800, "typical": "1000-1600cc"},
-		"Naked": {"min": 250, "max": 1000, "typical": "400-800cc"},
-		"Adventure": {"min": 650, "max": 1250, "typical": "800-1200cc"},
-		"Scooter": {"min": 50, "max": 300, "typical": "125-250cc"},
-		"Electric": {"min": 0, "max": 0, "typical": "N/A - Electric motor"}
-	}
+	return dict(ENGINE_CAPACITY_RANGES.get(moto_type, {"min": 0, "max": 2000, "typical": "Varies"}))
+
 
-	return capacity_ranges.get(moto_type, {"min": 0, "max": 2000, "typical": "Varies"})
+def on_doctype_update():
+	"""Indexes for the per-user views, the static listing pages and the description blob cleanup"""
+	frappe.db.add_index("Moto Demo", ["created_by_user", "status"])
+	frappe.db.add_index("Moto Demo", ["modified_by_user", "modified"])
+	frappe.db.add_index("Moto Demo", ["published", "creation"])
+	frappe.db.add_index("Moto Demo", ["description_hash"])
@@ -116,7 +116,7 @@ class TestMotoDemo(FrappeTestCase):
 		doc.insert()
 
 		# Test get_moto_info method
-		info = doc.get_moto_info()
+		info = doc.get_moto_info(include_description=1)
 
 		self.assertEqual(info["title"], doc.title)
 		self.assertEqual(info["status"], "Active")
@@ -127,6 +127,9 @@ class TestMotoDemo(FrappeTestCase):
 		self.assertEqual(info["demo_date"], "2024-01-15")
 		self.assertEqual(info["demo_time"], "10:30:00")
 
+		# The description is left out unless requested
+		self.assertNotIn("description", doc.get_moto_info())
+
 	def test_status_options(self):
 		"""Test that all status options work correctly"""
 		status_options = ["Draft", "Active", "Inactive", "Completed"]
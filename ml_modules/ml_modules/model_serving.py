@@ -0,0 +1,227 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+"""
+Serving layer for the Moto Demo engine capacity model
+
+Trained models are stored as versioned JSON artifacts in the site's private folder
+and the current version is shared between workers through Redis. Each process keeps
+the last few loaded models in an LRU cache and only re-checks the current version
+every `VERSION_CHECK_INTERVAL` seconds, so scoring a record inside `validate()` does
+not touch Redis or the disk. Until a model is trained, a model built from the typical
+capacity ranges alone is served.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import frappe
+from frappe.utils import flt
+
+from ml_modules.ml_modules import snapshots
+from ml_modules.ml_modules.moto_type_model import MotoTypeModel
+from ml_modules.ml_modules.replica import replica_read
+from ml_modules.ml_modules.utils import ENGINE_CAPACITY_RANGES
+
+# version served while no model has been trained yet
+PRIOR_VERSION = "prior"
+
+# records with a capacity further than this many standard deviations from their type are flagged
+ANOMALY_THRESHOLD = 3.0
+
+# models kept in memory per process
+MODEL_CACHE_SIZE = 4
+
+# artifacts kept on disk, older ones are removed after training
+KEEP_ARTIFACTS = 5
+
+# seconds between checks for a newly trained model
+VERSION_CHECK_INTERVAL = 30
+
+MAX_BATCH_SIZE = 10000
+
+CURRENT_VERSION_KEY = "ml_modules:moto_type_model:current"
+
+_models = OrderedDict()
+_current_versions = {}
+_lock = threading.Lock()
+
+
+def get_model():
+	"""Return the current model of this site, loading it into the LRU cache if needed"""
+	site = frappe.local.site
+	version, checked_at = _current_versions.get(site, (None, 0))
+	if time.monotonic() - checked_at > VERSION_CHECK_INTERVAL:
+		version = frappe.cache().get_value(CURRENT_VERSION_KEY, generator=_latest_artifact_version)
+		version = version or PRIOR_VERSION
+		_current_versions[site] = (version, time.monotonic())
+
+	key = (site, version)
+	with _lock:
+		model = _models.get(key)
+		if model:
+			_models.move_to_end(key)
+			return model
+
+	model = _load_model(version)
+	with _lock:
+		_models[key] = model
+		while len(_models) > MODEL_CACHE_SIZE:
+			_models.popitem(last=False)
+
+	return model
+
+
+def score_record(moto_type, engine_capacity):
+	"""Score a single record with the current model"""
+	model = get_model()
+	anomaly_score, suggested_moto_type, confidence = model.score_one(moto_type, flt(engine_capacity))
+	return frappe._dict(
+		anomaly_score=anomaly_score,
+		is_anomaly=anomaly_score is not None and anomaly_score > ANOMALY_THRESHOLD,
+		suggested_moto_type=suggested_moto_type,
+		confidence=confidence,
+		model_version=model.version,
+	)
+
+
+@frappe.whitelist()
+def score_moto_demos(names=None, records=None):
+	"""
+	Score many Moto Demo records in one vectorized pass
+
+	Takes either `names` of existing records or `records`, a list of dicts
+	with `moto_type` and `engine_capacity` (and optionally `name`).
+	"""
+	frappe.has_permission("Moto Demo", "read", throw=True)
+
+	if names:
+		records = _get_records(frappe.parse_json(names))
+	else:
+		records = frappe.parse_json(records) or []
+
+	if len(records) > MAX_BATCH_SIZE:
+		frappe.throw(f"Cannot score more than {MAX_BATCH_SIZE} records per call")
+
+	model = get_model()
+	anomaly_scores, suggestions, confidences = model.score(
+		[record.get("moto_type") for record in records],
+		[flt(record.get("engine_capacity")) for record in records],
+	)
+
+	results = []
+	for record, anomaly_score, suggestion, confidence in zip(
+		records, anomaly_scores.tolist(), suggestions.tolist(), confidences.tolist(), strict=True
+	):
+		anomaly_score = None if math.isnan(anomaly_score) else anomaly_score
+		results.append(
+			{
+				"name": record.get("name"),
+				"anomaly_score": anomaly_score,
+				"is_anomaly": anomaly_score is not None and anomaly_score > ANOMALY_THRESHOLD,
+				"suggested_moto_type": suggestion,
+				"confidence": None if math.isnan(confidence) else confidence,
+			}
+		)
+
+	return {"model_version": model.version, "results": results}
+
+
+@frappe.whitelist()
+def train_moto_type_model():
+	"""Train a new model from the existing Moto Demo records and make it current"""
+	frappe.only_for("System Manager")
+
+	rows = _get_training_rows()
+	model = MotoTypeModel.fit(
+		[row.moto_type for row in rows],
+		[row.engine_capacity for row in rows],
+		ENGINE_CAPACITY_RANGES,
+	)
+
+	with open(_artifact_path(model.version), "w") as f:
+		json.dump(model.as_dict(), f)
+
+	frappe.cache().set_value(CURRENT_VERSION_KEY, model.version)
+	_prune_artifacts()
+
+	return {"version": model.version, "trained_at": model.trained_at, "n_samples": model.n_samples}
+
+
+def _get_training_rows():
+	"""Read the training data from the columnar snapshot when there is one"""
+	if not snapshots.snapshot_exists("Moto Demo"):
+		return _get_training_rows_from_db()
+
+	return [
+		frappe._dict(row)
+		for row in snapshots.read_snapshot("Moto Demo", ["moto_type", "engine_capacity"]).to_pylist()
+		if row["moto_type"] and (row["engine_capacity"] or 0) > 0
+	]
+
+
+@replica_read()
+def _get_training_rows_from_db():
+	return frappe.db.sql(
+		"""
+		SELECT moto_type, engine_capacity
+		FROM `tabMoto Demo`
+		WHERE IFNULL(moto_type, '') != '' AND engine_capacity > 0
+	""",
+		as_dict=True,
+	)
+
+
+def _get_records(names):
+	if len(names) > MAX_BATCH_SIZE:
+		frappe.throw(f"Cannot score more than {MAX_BATCH_SIZE} records per call")
+
+	# `get_list` leaves out records the user's User Permissions do not cover
+	return frappe.get_list(
+		"Moto Demo",
+		filters={"name": ("in", names)},
+		fields=["name", "moto_type", "engine_capacity"],
+	)
+
+
+def _load_model(version):
+	if version != PRIOR_VERSION:
+		path = _artifact_path(version)
+		if os.path.exists(path):
+			with open(path) as f:
+				return MotoTypeModel.from_dict(json.load(f))
+
+	return MotoTypeModel.prior(ENGINE_CAPACITY_RANGES, version=PRIOR_VERSION)
+
+
+def _latest_artifact_version():
+	artifacts = _list_artifacts()
+	return artifacts[-1][len("moto_type-") : -len(".json")] if artifacts else None
+
+
+def _prune_artifacts():
+	for filename in _list_artifacts()[:-KEEP_ARTIFACTS]:
+		os.remove(os.path.join(_artifact_dir(), filename))
+
+
+def _list_artifacts():
+	"""Artifact filenames, oldest first (versions start with the training timestamp)"""
+	return sorted(
+		filename
+		for filename in os.listdir(_artifact_dir())
+		if filename.startswith("moto_type-") and filename.endswith(".json")
+	)
+
+
+def _artifact_path(version):
+	return os.path.join(_artifact_dir(), f"moto_type-{version}.json")
+
+
+def _artifact_dir():
+	path = frappe.get_site_path("private", "ml_modules_models")
+	os.makedirs(path, exist_ok=True)
+	return path
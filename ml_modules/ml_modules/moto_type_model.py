@@ -0,0 +1,195 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+"""
+Engine capacity model for Moto Demo
+
+A Gaussian class-conditional model on log engine capacity, one component per
+moto_type. It is used to
+
+- score how unusual an engine capacity is for the given moto_type (a z-score), and
+- suggest the most likely moto_type for a capacity when the type is missing.
+
+Class statistics are shrunk towards priors derived from the typical capacity ranges,
+so types with few or no rows still get sensible parameters. This module only depends
+on NumPy; training data loading, artifact storage and caching live in `model_serving`.
+"""
+
+import hashlib
+import json
+import math
+from datetime import datetime
+
+import numpy as np
+
+# smallest standard deviation of log capacity, keeps single-valued classes usable
+MIN_STD = 0.05
+
+# weight of the range prior, in number of pseudo-observations
+PRIOR_WEIGHT = 5.0
+
+
+class MotoTypeModel:
+	"""Gaussian model of log engine capacity per moto_type"""
+
+	def __init__(self, classes, means, stds, log_priors, version=None, trained_at=None, n_samples=0):
+		self.classes = list(classes)
+		self.means = np.asarray(means, dtype=np.float64)
+		self.stds = np.asarray(stds, dtype=np.float64)
+		self.log_priors = np.asarray(log_priors, dtype=np.float64)
+		self.trained_at = trained_at
+		self.n_samples = n_samples
+		self.version = version or self._make_version()
+		self._index = {moto_type: index for index, moto_type in enumerate(self.classes)}
+
+		# plain float copies for the single-record path, where NumPy call overhead dominates
+		self._params = [
+			(float(mean), float(std), float(log_prior))
+			for mean, std, log_prior in zip(self.means, self.stds, self.log_priors, strict=True)
+		]
+
+	@classmethod
+	def fit(cls, moto_types, capacities, capacity_ranges):
+		"""
+		Train from parallel sequences of moto_types and engine capacities
+
+		`capacity_ranges` maps each moto_type to {"min": ..., "max": ...} and
+		defines both the classes and their priors.
+		"""
+		classes, means, stds, log_priors, n_samples = _fit_params(moto_types, capacities, capacity_ranges)
+		return cls(
+			classes,
+			means,
+			stds,
+			log_priors,
+			trained_at=datetime.now().isoformat(timespec="seconds"),
+			n_samples=n_samples,
+		)
+
+	@classmethod
+	def prior(cls, capacity_ranges, version):
+		"""Untrained model from `capacity_ranges` alone, named `version` so it is the same in every process"""
+		classes, means, stds, log_priors, _n_samples = _fit_params([], [], capacity_ranges)
+		return cls(classes, means, stds, log_priors, version=version)
+
+	def score_one(self, moto_type, capacity):
+		"""
+		Score a single record in pure Python
+
+		Returns (anomaly_score, suggested_moto_type, confidence); each is None
+		when it does not apply.
+		"""
+		if not capacity or capacity <= 0:
+			return None, None, None
+
+		x = math.log1p(capacity)
+		if moto_type:
+			index = self._index.get(moto_type)
+			if index is None:
+				return None, None, None
+
+			mean, std, _log_prior = self._params[index]
+			return abs(x - mean) / std, None, None
+
+		log_likelihoods = [
+			-0.5 * ((x - mean) / std) ** 2 - math.log(std) + log_prior
+			for mean, std, log_prior in self._params
+		]
+		best = max(range(len(log_likelihoods)), key=log_likelihoods.__getitem__)
+		total = sum(math.exp(value - log_likelihoods[best]) for value in log_likelihoods)
+		return None, self.classes[best], 1.0 / total
+
+	def score(self, moto_types, capacities):
+		"""
+		Score many records at once
+
+		Returns (anomaly_scores, suggested_moto_types, confidences) as arrays.
+		Anomaly scores are NaN where the type is missing or unknown or the
+		capacity is not set; suggestions are only made where the type is missing.
+		"""
+		moto_types = np.asarray(moto_types, dtype=object)
+		capacities = np.nan_to_num(np.asarray(capacities, dtype=np.float64), nan=0.0)
+		has_capacity = capacities > 0
+		x = np.log1p(np.clip(capacities, 0, None))
+
+		class_index = np.array([self._index.get(moto_type, -1) for moto_type in moto_types], dtype=np.int64)
+		known = (class_index >= 0) & has_capacity
+		safe_index = np.where(known, class_index, 0)
+
+		anomaly_scores = np.full(len(x), np.nan)
+		anomaly_scores[known] = (
+			np.abs(x[known] - self.means[safe_index[known]]) / self.stds[safe_index[known]]
+		)
+
+		# log-likelihood of every record under every class, shape (records, classes)
+		z = (x[:, None] - self.means[None, :]) / self.stds[None, :]
+		log_likelihoods = -0.5 * z**2 - np.log(self.stds)[None, :] + self.log_priors[None, :]
+		best = log_likelihoods.argmax(axis=1)
+		shifted = np.exp(log_likelihoods - log_likelihoods[np.arange(len(x)), best][:, None])
+		confidences = 1.0 / shifted.sum(axis=1)
+
+		needs_suggestion = has_capacity & np.array([not moto_type for moto_type in moto_types], dtype=bool)
+		suggestions = np.where(needs_suggestion, np.asarray(self.classes, dtype=object)[best], None)
+		confidences = np.where(needs_suggestion, confidences, np.nan)
+
+		return anomaly_scores, suggestions, confidences
+
+	def as_dict(self):
+		return {
+			"version": self.version,
+			"trained_at": self.trained_at,
+			"n_samples": self.n_samples,
+			"classes": self.classes,
+			"means": self.means.tolist(),
+			"stds": self.stds.tolist(),
+			"log_priors": self.log_priors.tolist(),
+		}
+
+	@classmethod
+	def from_dict(cls, data):
+		return cls(
+			data["classes"],
+			data["means"],
+			data["stds"],
+			data["log_priors"],
+			version=data["version"],
+			trained_at=data.get("trained_at"),
+			n_samples=data.get("n_samples", 0),
+		)
+
+	def _make_version(self):
+		params = json.dumps([self.classes, self.means.tolist(), self.stds.tolist(), self.log_priors.tolist()])
+		digest = hashlib.sha1(params.encode()).hexdigest()[:8]
+		stamp = (self.trained_at or "prior").replace("-", "").replace(":", "").replace("T", "")
+		return f"{stamp}-{digest}"
+
+
+def _fit_params(moto_types, capacities, capacity_ranges):
+	"""Per-class parameters shrunk towards the range priors, and the number of samples"""
+	classes = list(capacity_ranges)
+	moto_types = np.asarray(moto_types, dtype=object)
+	x = np.log1p(np.clip(np.asarray(capacities, dtype=np.float64), 0, None))
+
+	means, stds, counts = [], [], []
+	for moto_type in classes:
+		prior_mean, prior_std = _range_prior(capacity_ranges[moto_type])
+		values = x[moto_types == moto_type]
+		n = len(values)
+
+		mean = (values.sum() + PRIOR_WEIGHT * prior_mean) / (n + PRIOR_WEIGHT)
+		variance = (((values - mean) ** 2).sum() + PRIOR_WEIGHT * prior_std**2) / (n + PRIOR_WEIGHT)
+
+		means.append(mean)
+		stds.append(max(math.sqrt(variance), MIN_STD))
+		counts.append(n)
+
+	counts = np.asarray(counts, dtype=np.float64)
+	log_priors = np.log((counts + 1) / (counts.sum() + len(classes)))
+
+	return classes, means, stds, log_priors, int(counts.sum())
+
+
+def _range_prior(capacity_range):
+	"""Mean and standard deviation of log capacity implied by a typical range"""
+	low, high = math.log1p(capacity_range["min"]), math.log1p(capacity_range["max"])
+	return (low + high) / 2, max((high - low) / 4, MIN_STD)
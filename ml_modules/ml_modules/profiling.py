@@ -0,0 +1,305 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+"""
+Opt-in profiling of sampled ML Modules requests
+
+Enabled with the `ml_modules_profiling` site config:
+
+	"ml_modules_profiling": {
+		"methods": ["get_moto_stats"],
+		"doctypes": ["Moto Demo"],
+		"users": ["jane@example.com"],
+		"sample_rate": 0.1,
+		"mode": "sampling",
+		"retention": 100
+	}
+
+A request is profiled when it calls one of `methods` (full dotted path or function
+name) or works on one of `doctypes` (form saves, document methods, REST resources),
+is made by one of `users`, and falls in the `sample_rate`. Empty lists match
+everything. `mode` is `cprofile` (default) or `sampling`, a stack sampler taking
+a sample every `sampling_interval_ms` (default 5) with far less overhead.
+
+Every profiled request leaves one JSON artifact in the site's private folder with the
+profile and every query run through `frappe.db.sql`, with its duration and the
+connection it ran on (`primary`, or `replica` inside `replica_read` functions).
+Only the newest `retention` artifacts are kept (default 100).
+
+Without the site config the request hooks return after one dictionary lookup.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+import frappe
+from frappe.utils import cint, flt, now, now_datetime
+
+MODE_CPROFILE = "cprofile"
+MODE_SAMPLING = "sampling"
+
+DEFAULT_RETENTION = 100
+DEFAULT_SAMPLING_INTERVAL_MS = 5
+
+# rows of the cProfile table kept in an artifact, sorted by cumulative time
+MAX_PROFILE_ROWS = 300
+MAX_QUERY_LENGTH = 10000
+
+METHOD_PATH_PATTERN = re.compile(r"^/api/(?:v\d+/)?method/(?P<method>[^/]+)")
+RESOURCE_PATH_PATTERN = re.compile(r"^/api/(?:v\d+/)?(?:resource|document)/(?P<doctype>[^/]+)")
+ARTIFACT_NAME_PATTERN = re.compile(r"^[\w-]+\.json$")
+
+
+def before_request():
+	"""Start profiling the request when it matches the `ml_modules_profiling` site config"""
+	conf = frappe.conf.get("ml_modules_profiling")
+	if not conf:
+		return
+
+	method, doctype = _describe_request()
+	if not matches(conf, method, doctype, frappe.session.user):
+		return
+
+	frappe.local.ml_modules_profile = RequestProfile(conf, method, doctype)
+	frappe.local.ml_modules_profile.start()
+
+
+def after_request(response=None, request=None):
+	"""Stop the profile of the request, if any, and store it"""
+	profile = getattr(frappe.local, "ml_modules_profile", None)
+	if not profile:
+		return
+
+	frappe.local.ml_modules_profile = None
+	profile.stop()
+	profile.save(getattr(response, "status_code", None))
+
+
+def track_connection(db, label):
+	"""Add the queries of another connection, such as the read replica, to the current profile"""
+	profile = getattr(frappe.local, "ml_modules_profile", None)
+	if profile:
+		profile.track(db, label)
+
+
+def matches(conf, method, doctype, user):
+	"""Return True if a request should be profiled, rolling the dice for `sample_rate`"""
+	methods, doctypes, users = conf.get("methods") or [], conf.get("doctypes") or [], conf.get("users") or []
+
+	if methods or doctypes:
+		method_matches = bool(method) and any(method == m or method.rsplit(".", 1)[-1] == m for m in methods)
+		if not method_matches and doctype not in doctypes:
+			return False
+
+	if users and user not in users:
+		return False
+
+	return random.random() < flt(conf.get("sample_rate", 1))
+
+
+class RequestProfile:
+	"""Profile and query log of one request"""
+
+	def __init__(self, conf, method=None, doctype=None):
+		self.conf = conf
+		self.mode = conf.get("mode") or MODE_CPROFILE
+		self.method = method
+		self.doctype = doctype
+		self.queries = []
+		self.stacks = Counter()
+		self.profiler = None
+		self.sampler = None
+		self.connections = []
+
+	def start(self):
+		self.started_at = now()
+		self.start_time = time.perf_counter()
+		# the connection itself, not the `frappe.db` proxy, so the replica swap does not affect it
+		self.track(frappe.local.db, "primary")
+
+		if self.mode == MODE_SAMPLING:
+			self.stop_sampling = threading.Event()
+			self.sampler = threading.Thread(target=self._sample, args=(threading.get_ident(),), daemon=True)
+			self.sampler.start()
+		else:
+			self.profiler = cProfile.Profile()
+			self.profiler.enable()
+
+	def stop(self):
+		if self.profiler:
+			self.profiler.disable()
+		if self.sampler:
+			self.stop_sampling.set()
+			self.sampler.join()
+
+		self.duration = time.perf_counter() - self.start_time
+		self._untrack_all()
+
+	def save(self, status_code=None):
+		"""Write the artifact and prune the old ones"""
+		artifact = {
+			"started_at": self.started_at,
+			"duration": self.duration,
+			"method": self.method,
+			"doctype": self.doctype,
+			"path": frappe.request.path if getattr(frappe.local, "request", None) else None,
+			"user": frappe.session.user,
+			"status_code": status_code,
+			"mode": self.mode,
+			"query_count": len(self.queries),
+			"query_time": sum(query["duration"] for query in self.queries),
+			"queries": self.queries,
+		}
+		if self.profiler:
+			artifact["profile"] = _profile_rows(self.profiler)
+		else:
+			artifact["stacks"] = dict(self.stacks.most_common())
+
+		name = f"{now_datetime().strftime('%Y%m%d%H%M%S%f')}-{frappe.generate_hash(length=6)}.json"
+		with open(os.path.join(_artifact_dir(), name), "w") as f:
+			json.dump(artifact, f, default=str)
+
+		_prune_artifacts(cint(self.conf.get("retention")) or DEFAULT_RETENTION)
+		return name
+
+	def track(self, db, label):
+		"""Log the queries run on the connection `db`, tagged with `label`"""
+		sql = db.sql
+
+		def timed_sql(query, *args, **kwargs):
+			start = time.perf_counter()
+			try:
+				return sql(query, *args, **kwargs)
+			finally:
+				executed = getattr(db, "last_query", None) or query
+				self.queries.append(
+					{
+						"query": frappe.safe_decode(executed)[:MAX_QUERY_LENGTH],
+						"duration": time.perf_counter() - start,
+						"connection": label,
+					}
+				)
+
+		db.sql = timed_sql
+		self.connections.append(db)
+
+	def _untrack_all(self):
+		# the instance attribute shadows the method, removing it restores the method
+		for db in self.connections:
+			if "sql" in db.__dict__:
+				del db.sql
+		self.connections = []
+
+	def _sample(self, thread_id):
+		interval = (cint(self.conf.get("sampling_interval_ms")) or DEFAULT_SAMPLING_INTERVAL_MS) / 1000
+		while not self.stop_sampling.wait(interval):
+			frame = sys._current_frames().get(thread_id)
+			stack = []
+			while frame:
+				code = frame.f_code
+				stack.append(f"{code.co_filename}:{code.co_name}:{frame.f_lineno}")
+				frame = frame.f_back
+			if stack:
+				# collapsed stack format, root first, as read by flame graph tools
+				self.stacks[";".join(reversed(stack))] += 1
+
+
+@frappe.whitelist()
+def list_profiles():
+	"""Return the stored profiles, newest first, without their bodies"""
+	frappe.only_for("System Manager")
+
+	profiles = []
+	for name in reversed(_list_artifacts()):
+		with open(os.path.join(_artifact_dir(), name)) as f:
+			artifact = json.load(f)
+		profiles.append(
+			{
+				"name": name,
+				"started_at": artifact.get("started_at"),
+				"duration": artifact.get("duration"),
+				"method": artifact.get("method"),
+				"doctype": artifact.get("doctype"),
+				"user": artifact.get("user"),
+				"mode": artifact.get("mode"),
+				"query_count": artifact.get("query_count"),
+				"query_time": artifact.get("query_time"),
+			}
+		)
+	return profiles
+
+
+@frappe.whitelist()
+def download_profile(name):
+	"""Send a stored profile as a file download"""
+	frappe.only_for("System Manager")
+
+	if not ARTIFACT_NAME_PATTERN.match(name or "") or name not in _list_artifacts():
+		frappe.throw(f"Profile {name} not found", frappe.DoesNotExistError)
+
+	with open(os.path.join(_artifact_dir(), name), "rb") as f:
+		frappe.local.response.filecontent = f.read()
+	frappe.local.response.filename = name
+	frappe.local.response.type = "download"
+
+
+def _describe_request():
+	"""Return the whitelisted method and the doctype a request works on"""
+	request = frappe.request
+	form_dict = frappe.form_dict
+
+	match = METHOD_PATH_PATTERN.match(request.path)
+	method = match.group("method") if match else form_dict.get("cmd")
+
+	match = RESOURCE_PATH_PATTERN.match(request.path)
+	doctype = match.group("doctype") if match else form_dict.get("doctype") or form_dict.get("dt")
+	document = form_dict.get("doc") or form_dict.get("docs")
+	if not doctype and document:
+		# frappe.desk.form.save.savedocs and document methods send the document as JSON
+		try:
+			doctype = frappe.parse_json(document).get("doctype")
+		except Exception:
+			doctype = None
+
+	return method, doctype
+
+
+def _profile_rows(profiler):
+	stats = pstats.Stats(profiler, stream=io.StringIO())
+	rows = []
+	for (filename, lineno, function), (_cc, ncalls, tottime, cumtime, _callers) in stats.stats.items():
+		rows.append(
+			{
+				"function": f"{filename}:{lineno}({function})",
+				"ncalls": ncalls,
+				"tottime": tottime,
+				"cumtime": cumtime,
+			}
+		)
+	rows.sort(key=lambda row: row["cumtime"], reverse=True)
+	return rows[:MAX_PROFILE_ROWS]
+
+
+def _prune_artifacts(retention):
+	for name in _list_artifacts()[:-retention]:
+		os.remove(os.path.join(_artifact_dir(), name))
+
+
+def _list_artifacts():
+	"""Artifact filenames, oldest first (names start with the request timestamp)"""
+	return sorted(name for name in os.listdir(_artifact_dir()) if ARTIFACT_NAME_PATTERN.match(name))
+
+
+def _artifact_dir():
+	path = frappe.get_site_path("private", "ml_modules_profiles")
+	os.makedirs(path, exist_ok=True)
+	return path
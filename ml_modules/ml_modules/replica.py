@@ -0,0 +1,171 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+"""
+Read-replica routing for read-only ML Modules endpoints
+
+Functions decorated with `replica_read()` run against the read replica configured
+with the standard Frappe site config keys (`read_from_replica`, `replica_host`,
+`replica_db_port`, `different_credentials_for_replica`, ...). They fall back to the
+primary when:
+
+- the replica is down or lags more than `replica_max_lag` seconds (default 10),
+- the current request already wrote to the database,
+- the session saved a demo less than `replica_read_your_writes_window` seconds ago
+  (default 60), unless `replica_read_your_writes` is set to 0.
+
+The replica health is probed at most once every `replica_health_check_interval`
+seconds (default 5) per site and shared between workers through Redis.
+"""
+
+import functools
+
+import frappe
+from frappe.utils import cint, flt
+
+from ml_modules.ml_modules import profiling
+
+HEALTH_OK = "ok"
+HEALTH_DOWN = "down"
+HEALTH_LAGGING = "lagging"
+
+
+def replica_read():
+	"""Route the decorated read-only function to the read replica when it is healthy"""
+
+	def decorator(fn):
+		@functools.wraps(fn)
+		def wrapper(*args, **kwargs):
+			if not should_read_from_replica():
+				return fn(*args, **kwargs)
+
+			replica = _connect_replica()
+			if not replica:
+				return fn(*args, **kwargs)
+
+			profiling.track_connection(replica, "replica")
+			primary = frappe.local.db
+			frappe.local.db = replica
+			frappe.local.flags.ml_modules_on_replica = True
+			try:
+				return fn(*args, **kwargs)
+			except replica.OperationalError:
+				# the replica went away mid-call; reads are safe to repeat on the primary
+				_set_health(HEALTH_DOWN)
+				frappe.local.db = primary
+				return fn(*args, **kwargs)
+			finally:
+				frappe.local.db = primary
+				frappe.local.flags.ml_modules_on_replica = False
+				replica.close()
+
+		return wrapper
+
+	return decorator
+
+
+def should_read_from_replica():
+	"""Return True if reads in the current request may be served by the replica"""
+	conf = frappe.conf
+	if not conf.read_from_replica or not conf.replica_host:
+		return False
+
+	# nested calls already run on the replica
+	if frappe.local.flags.ml_modules_on_replica:
+		return False
+
+	# keep this request's own writes visible
+	if frappe.db.transaction_writes:
+		return False
+
+	if cint(conf.get("replica_read_your_writes", 1)) and frappe.cache().get_value(_pin_key()):
+		return False
+
+	return (frappe.cache().get_value(_health_key()) or HEALTH_OK) == HEALTH_OK
+
+
+def pin_session_to_primary():
+	"""Serve this session's replica reads from the primary until the replica has caught up"""
+	conf = frappe.conf
+	if not conf.read_from_replica or not cint(conf.get("replica_read_your_writes", 1)):
+		return
+
+	window = cint(conf.get("replica_read_your_writes_window")) or 60
+	frappe.cache().set_value(_pin_key(), 1, expires_in_sec=window)
+
+
+def get_replica_lag():
+	"""Return the replica lag in seconds, or None if the replica is unreachable or not replicating"""
+	replica = _connect_replica(check_health=False)
+	if not replica:
+		return None
+
+	try:
+		return _read_lag(replica)
+	except Exception:
+		return None
+	finally:
+		replica.close()
+
+
+def _connect_replica(check_health=True):
+	from frappe.database import get_db
+
+	conf = frappe.conf
+	user, password = conf.db_user, conf.db_password
+	if conf.different_credentials_for_replica:
+		user = conf.replica_db_user or conf.replica_db_name
+		password = conf.replica_db_password
+
+	try:
+		replica = get_db(host=conf.replica_host, port=conf.replica_db_port, user=user, password=password)
+		health = frappe.cache().get_value(_health_key()) if check_health else HEALTH_OK
+		if health is None:
+			health = _probe(replica)
+	except Exception:
+		_set_health(HEALTH_DOWN)
+		frappe.log_error("Read replica unreachable, falling back to primary")
+		return None
+
+	if health != HEALTH_OK:
+		replica.close()
+		return None
+
+	return replica
+
+
+def _probe(replica):
+	lag = _read_lag(replica)
+	max_lag = flt(frappe.conf.get("replica_max_lag")) or 10
+	if lag is None:
+		health = HEALTH_DOWN
+	elif lag > max_lag:
+		health = HEALTH_LAGGING
+	else:
+		health = HEALTH_OK
+
+	_set_health(health)
+	return health
+
+
+def _read_lag(replica):
+	status = replica.sql("SHOW SLAVE STATUS", as_dict=True)
+	if not status:
+		# a standalone instance (e.g. a second local MariaDB used for testing) never lags
+		return 0.0
+
+	lag = status[0].get("Seconds_Behind_Master")
+	return None if lag is None else flt(lag)
+
+
+def _set_health(health):
+	interval = cint(frappe.conf.get("replica_health_check_interval")) or 5
+	frappe.cache().set_value(_health_key(), health, expires_in_sec=interval)
+
+
+def _health_key():
+	return "ml_modules:replica_health"
+
+
+def _pin_key():
+	return f"ml_modules:replica_pin:{frappe.session.sid}"
@@ -0,0 +1,355 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+"""
+Columnar snapshots of the demo doctypes for analytics
+
+`build_snapshots` keeps one Arrow IPC snapshot per demo doctype in the site's private
+folder: a base file plus delta files. Each run follows the change-data-capture feed
+(`ml_modules.ml_modules.change_log`) from the cursor stored in the snapshot manifest
+and only writes the rows changed since then, with tombstones for deleted and renamed
+records. Once there are `MAX_DELTAS` deltas, or the change log no longer reaches back
+to the cursor, the base is rewritten and the deltas are dropped.
+
+Readers memory-map the files, so scanning a snapshot does not copy it into memory
+and does not touch the database:
+
+	table = read_snapshot("Moto Demo", columns=["moto_type", "engine_capacity"])
+	rows = aggregate_snapshot("Moto Demo", ["moto_type"], [("engine_capacity", "mean")])
+
+Needs the optional `pyarrow` package; without it the scheduled job does nothing.
+"""
+
+import datetime
+import json
+import os
+from decimal import Decimal
+
+import frappe
+from frappe.model import no_value_fields
+from frappe.utils import add_to_date, cint, now_datetime
+
+from ml_modules.ml_modules.change_log import (
+	DEFAULT_VISIBILITY_LAG,
+	EXCLUDED_FIELDS,
+	OPERATION_DELETE,
+	OPERATION_RENAME,
+	get_changes,
+)
+from ml_modules.ml_modules.utils import DEMO_DOCTYPES, validate_demo_doctype
+
+try:
+	import pyarrow as pa
+	import pyarrow.compute as pc
+	import pyarrow.ipc as ipc
+except ImportError:
+	pa = None
+
+# deltas kept before the base is rewritten
+MAX_DELTAS = 24
+
+# rows read from the database per batch of a full snapshot
+BATCH_SIZE = 10000
+
+DELETED_COLUMN = "_deleted"
+STANDARD_COLUMNS = ("name", "creation", "modified", "owner")
+
+
+def build_snapshots():
+	"""Scheduled update of the snapshots of every demo doctype"""
+	if not pa:
+		return
+
+	for doctype in DEMO_DOCTYPES:
+		build_snapshot(doctype)
+
+
+def build_snapshot(doctype, full=False):
+	"""Append the changes since the last run to the snapshot of `doctype`, or rebuild it"""
+	_check_pyarrow()
+	validate_demo_doctype(doctype)
+
+	manifest = _read_manifest(doctype)
+	schema = _schema(doctype)
+	if full or not manifest or manifest["columns"] != schema.names:
+		return _write_full_snapshot(doctype, schema)
+
+	names, deleted, cursor, resync_required = _changed_since(doctype, manifest["cursor"])
+	if resync_required:
+		return _write_full_snapshot(doctype, schema)
+	if cursor == manifest["cursor"]:
+		return manifest
+
+	table = _rows_table(doctype, schema, _get_rows(doctype, schema, names=names), deleted)
+	delta = f"delta-{cursor}.arrow"
+	_write_table(os.path.join(_snapshot_dir(doctype), delta), table)
+
+	manifest["deltas"].append(delta)
+	manifest["cursor"] = cursor
+	manifest["built_at"] = str(now_datetime())
+	_write_manifest(doctype, manifest)
+
+	if len(manifest["deltas"]) >= MAX_DELTAS:
+		manifest = compact_snapshot(doctype)
+
+	return manifest
+
+
+def compact_snapshot(doctype):
+	"""Merge the deltas of a snapshot into a new base"""
+	_check_pyarrow()
+	manifest = _read_manifest(doctype)
+	if not manifest or not manifest["deltas"]:
+		return manifest
+
+	base = f"base-{manifest['cursor']}.arrow"
+	_write_table(os.path.join(_snapshot_dir(doctype), base), _merged_table(doctype, manifest))
+
+	obsolete = [manifest["base"], *manifest["deltas"]]
+	manifest.update({"base": base, "deltas": []})
+	_write_manifest(doctype, manifest)
+	_remove_files(doctype, obsolete)
+	return manifest
+
+
+def read_snapshot(doctype, columns=None):
+	"""
+	Return the current rows of the snapshot of `doctype` as a pyarrow Table
+
+	Files are memory-mapped and only `columns` are read from them. Without deltas the
+	table references the mapped base directly; otherwise the base rows the deltas
+	replace are filtered out and the delta rows appended, which copies the selected
+	columns.
+	"""
+	_check_pyarrow()
+	manifest = _read_manifest(doctype)
+	if not manifest:
+		frappe.throw(f"No snapshot of {doctype} has been built yet")
+
+	table = _merged_table(doctype, manifest, columns)
+	return table.select(columns) if columns else table.drop_columns([DELETED_COLUMN])
+
+
+def aggregate_snapshot(doctype, group_by, aggregations):
+	"""
+	Group the snapshot of `doctype` and aggregate it with pyarrow
+
+	`aggregations` are (column, function) pairs, e.g. [("engine_capacity", "mean")].
+	"""
+	columns = list(dict.fromkeys([*group_by, *(column for column, _function in aggregations)]))
+	return read_snapshot(doctype, columns).group_by(group_by).aggregate(aggregations).to_pylist()
+
+
+def snapshot_exists(doctype):
+	"""Return True if a snapshot of `doctype` can be read"""
+	return bool(pa) and _read_manifest(doctype) is not None
+
+
+def _merged_table(doctype, manifest, columns=None):
+	"""Base and deltas merged into the current rows, tombstones removed, limited to `columns` if given"""
+	if columns:
+		columns = list(dict.fromkeys([*columns, "name", DELETED_COLUMN]))
+
+	base = _read_table(doctype, manifest["base"], columns)
+	if not manifest["deltas"]:
+		# a base never holds tombstones, so it is returned as mapped
+		return base
+
+	tables = [base]
+	for delta in manifest["deltas"]:
+		table = _read_table(doctype, delta, columns)
+		# every earlier copy of a record in this delta is outdated
+		replaced = table.column("name")
+		tables = [t.filter(pc.invert(pc.is_in(t.column("name"), value_set=replaced))) for t in tables]
+		tables.append(table)
+
+	table = pa.concat_tables(tables)
+	return table.filter(pc.invert(table.column(DELETED_COLUMN)))
+
+
+def _write_full_snapshot(doctype, schema):
+	cursor = _current_cursor()
+	base = f"base-{cursor}.arrow"
+	path = os.path.join(_snapshot_dir(doctype), base)
+
+	with pa.OSFile(path + ".tmp", "wb") as sink, ipc.new_file(sink, schema) as writer:
+		last_name = ""
+		while True:
+			rows = _get_rows(doctype, schema, after=last_name)
+			if not rows:
+				break
+			writer.write_table(_rows_table(doctype, schema, rows))
+			last_name = rows[-1]["name"]
+	os.replace(path + ".tmp", path)
+
+	previous = _read_manifest(doctype)
+	manifest = {
+		"doctype": doctype,
+		"columns": schema.names,
+		"cursor": cursor,
+		"base": base,
+		"deltas": [],
+		"built_at": str(now_datetime()),
+	}
+	_write_manifest(doctype, manifest)
+	if previous:
+		# a rebuild without new changes reuses the name of the previous base
+		_remove_files(doctype, [f for f in (previous["base"], *previous["deltas"]) if f != base])
+	return manifest
+
+
+def _changed_since(doctype, cursor):
+	"""Return the names to re-read and to delete since `cursor`, and the new cursor"""
+	names, deleted = set(), set()
+	while True:
+		page = get_changes(since=cursor, limit=5000, doctype=doctype)
+		if page["resync_required"]:
+			return names, deleted, cursor, True
+
+		for change in page["changes"]:
+			if change["operation"] == OPERATION_RENAME:
+				# an earlier change in the window may have queued the old name for a re-read
+				deleted.add(change["old_name"])
+				names.discard(change["old_name"])
+				names.add(change["name"])
+			elif change["operation"] == OPERATION_DELETE:
+				deleted.add(change["name"])
+				names.discard(change["name"])
+			else:
+				names.add(change["name"])
+				deleted.discard(change["name"])
+
+		cursor = page["cursor"]
+		if not page["has_more"]:
+			return names, deleted - names, cursor, False
+
+
+def _current_cursor():
+	"""Last change log sequence a full snapshot started now is guaranteed to include"""
+	visible_until = add_to_date(
+		now_datetime(),
+		seconds=-cint(frappe.conf.get("ml_modules_change_log_visibility_lag", DEFAULT_VISIBILITY_LAG)),
+	)
+	return cint(
+		frappe.db.sql(
+			"SELECT MAX(name) FROM `tabDemo Change Log` WHERE creation <= %s",
+			(visible_until,),
+		)[0][0]
+	)
+
+
+def _get_rows(doctype, schema, names=None, after=None):
+	columns = ", ".join(f"`{column}`" for column in schema.names if column != DELETED_COLUMN)
+	if names is not None:
+		if not names:
+			return []
+		return frappe.db.sql(
+			f"SELECT {columns} FROM `tab{doctype}` WHERE name IN %s ORDER BY name",
+			(tuple(names),),
+			as_dict=True,
+		)
+
+	return frappe.db.sql(
+		f"SELECT {columns} FROM `tab{doctype}` WHERE name > %s ORDER BY name LIMIT %s",
+		(after, BATCH_SIZE),
+		as_dict=True,
+	)
+
+
+def _rows_table(doctype, schema, rows, deleted=()):
+	columns = {column: [] for column in schema.names}
+	for row in rows:
+		for column in schema.names:
+			value = row.get(column)
+			# Time columns come back as timedelta and Float columns as Decimal
+			if isinstance(value, datetime.timedelta):
+				value = str(value)
+			elif isinstance(value, Decimal):
+				value = float(value)
+			columns[column].append(value)
+		columns[DELETED_COLUMN][-1] = False
+
+	for name in sorted(deleted):
+		for column in schema.names:
+			columns[column].append(None)
+		columns["name"][-1] = name
+		columns[DELETED_COLUMN][-1] = True
+
+	return pa.table(columns, schema=schema)
+
+
+def _schema(doctype):
+	"""Arrow schema of the snapshot, following the doctype meta"""
+	fields = [
+		pa.field("name", pa.string()),
+		pa.field("creation", pa.timestamp("us")),
+		pa.field("modified", pa.timestamp("us")),
+		pa.field("owner", pa.string()),
+	]
+	for df in frappe.get_meta(doctype).fields:
+		if (
+			df.fieldtype in no_value_fields
+			or df.fieldname in EXCLUDED_FIELDS
+			or df.fieldname in STANDARD_COLUMNS
+		):
+			continue
+		fields.append(pa.field(df.fieldname, _arrow_type(df.fieldtype)))
+	fields.append(pa.field(DELETED_COLUMN, pa.bool_()))
+	return pa.schema(fields)
+
+
+def _arrow_type(fieldtype):
+	if fieldtype in ("Int", "Check"):
+		return pa.int64()
+	if fieldtype in ("Float", "Currency", "Percent"):
+		return pa.float64()
+	if fieldtype == "Date":
+		return pa.date32()
+	if fieldtype == "Datetime":
+		return pa.timestamp("us")
+	return pa.string()
+
+
+def _read_table(doctype, filename, columns=None):
+	with pa.memory_map(os.path.join(_snapshot_dir(doctype), filename)) as source:
+		table = ipc.open_file(source).read_all()
+	return table.select(columns) if columns else table
+
+
+def _write_table(path, table):
+	with pa.OSFile(path + ".tmp", "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+		writer.write_table(table)
+	os.replace(path + ".tmp", path)
+
+
+def _read_manifest(doctype):
+	path = os.path.join(_snapshot_dir(doctype), "manifest.json")
+	if not os.path.exists(path):
+		return None
+	with open(path) as f:
+		return json.load(f)
+
+
+def _write_manifest(doctype, manifest):
+	path = os.path.join(_snapshot_dir(doctype), "manifest.json")
+	with open(path + ".tmp", "w") as f:
+		json.dump(manifest, f)
+	os.replace(path + ".tmp", path)
+
+
+def _remove_files(doctype, filenames):
+	for filename in filenames:
+		path = os.path.join(_snapshot_dir(doctype), filename)
+		if os.path.exists(path):
+			os.remove(path)
+
+
+def _check_pyarrow():
+	if not pa:
+		frappe.throw("Columnar snapshots need the pyarrow package")
+
+
+def _snapshot_dir(doctype):
+	path = frappe.get_site_path("private", "ml_modules_snapshots", frappe.scrub(doctype))
+	os.makedirs(path, exist_ok=True)
+	return path
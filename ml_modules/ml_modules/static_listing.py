@@ -0,0 +1,406 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+"""
+Pre-rendered, precompressed listing pages and sitemaps for published demos
+
+For every demo doctype with a web route this builds:
+
+- `/<route>`: the newest published demos
+- `/<route>/page/<n>`: all published demos in publication order, `PAGE_SIZE` per page
+- `/sitemap-ml-modules-<doctype>-<k>.xml`: sitemap shards, a record's shard is CRC32(name) % SITEMAP_SHARDS
+- `/sitemap-ml-modules.xml`: the sitemap index of all shards
+
+Files are stored raw, gzipped and (when the `brotli` package is installed) brotli
+compressed, and served by `PrecompressedPageRenderer` with long cache headers and ETags.
+The record pages the listings and sitemaps link to are the doctypes' web views,
+rendered from `doctype/<doctype>/templates/<doctype>.html`.
+
+Pages are numbered from the oldest record, so publishing a demo only touches the last
+page while unpublishing or deleting one shifts the pages after it. The controllers mark
+the affected pages and shards as dirty and a deduplicated background job rebuilds only
+those.
+"""
+
+import gzip
+import math
+import os
+import re
+import zlib
+from functools import partial
+from xml.sax.saxutils import escape
+
+import frappe
+from frappe.utils import cint, get_url
+from frappe.website.page_renderers.base_renderer import BaseRenderer
+from werkzeug.wrappers import Response
+
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+PAGE_SIZE = 50
+SITEMAP_SHARDS = 16
+
+# web route of the listing of each doctype, same as the `route` of the DocType
+LISTING_ROUTES = {"Moto Demo": "moto-demos", "Lamaa Demo": "lamaa-demos"}
+
+SITEMAP_INDEX_ROUTE = "sitemap-ml-modules.xml"
+SHARD_ROUTE_PATTERN = re.compile(r"^sitemap-ml-modules-(?P<slug>[a-z-]+)-(?P<shard>\d+)\.xml$")
+PAGE_ROUTE_PATTERN = re.compile(r"^(?P<route>[a-z-]+)/page/(?P<page>\d+)$")
+
+# overridable with the `ml_modules_static_max_age` site config
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+CONTENT_TYPES = {".html": "text/html; charset=utf-8", ".xml": "application/xml; charset=utf-8"}
+
+
+def on_demo_update(doc):
+	"""Mark the listing pages and sitemap shard of a saved demo as dirty"""
+	before = doc.get_doc_before_save()
+	_mark_record(doc, was_published=bool(before and before.published), is_published=bool(doc.published))
+
+
+def on_demo_trash(doc):
+	"""Mark the listing pages and sitemap shard of a deleted demo as dirty"""
+	_mark_record(doc, was_published=bool(doc.published), is_published=False)
+
+
+def on_demo_rename(doc, old_name, new_name):
+	"""A renamed demo moves between sitemap shards"""
+	if doc.published:
+		marks = {
+			"index",
+			f"page:{_page_of(doc)}",
+			f"shard:{shard_of(old_name)}",
+			f"shard:{shard_of(new_name)}",
+		}
+		frappe.db.after_commit.add(partial(_queue_build, doc.doctype, marks))
+
+
+def on_bulk_status_update(doctype, status, rows):
+	"""demo_status_bulk_update hook, the new modification dates change the sitemap lastmod"""
+	marks = {f"shard:{shard_of(row.name)}" for row in rows}
+	frappe.db.after_commit.add(partial(_queue_build, doctype, marks))
+
+
+def shard_of(name):
+	"""Sitemap shard of a record, stable for the lifetime of its name"""
+	return zlib.crc32(name.encode()) % SITEMAP_SHARDS
+
+
+def build_dirty_pages(doctype):
+	"""Rebuild the pages and shards of `doctype` marked as dirty until none are left"""
+	cache = frappe.cache()
+	key = _dirty_key(doctype)
+	while True:
+		pipe = cache.pipeline()
+		pipe.smembers(key)
+		pipe.delete(key)
+		marks, _deleted = pipe.execute()
+		if not marks:
+			return
+
+		_build(doctype, {frappe.safe_decode(mark) for mark in marks})
+
+
+def build_all_dirty_pages():
+	"""Scheduled catch-up for marks whose build job was skipped"""
+	for doctype in LISTING_ROUTES:
+		build_dirty_pages(doctype)
+
+
+def rebuild_static_listings(doctype=None):
+	"""Rebuild every listing page and sitemap shard, e.g. from `bench execute`"""
+	for dt in [doctype] if doctype else LISTING_ROUTES:
+		_remove_pages_after(dt, 0)
+		_build(dt, {"from:1", "index", *(f"shard:{shard}" for shard in range(SITEMAP_SHARDS))})
+	_render_sitemap_index()
+
+
+class PrecompressedPageRenderer(BaseRenderer):
+	"""Serves the pre-rendered listing pages and sitemaps"""
+
+	def can_render(self):
+		return _resolve(self.path) is not None
+
+	def render(self):
+		path = _ensure_built(_resolve(self.path))
+		if not path:
+			raise frappe.PageDoesNotExistError
+
+		stat = os.stat(path)
+		etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+		max_age = cint(frappe.conf.get("ml_modules_static_max_age")) or DEFAULT_MAX_AGE
+		headers = {
+			"Cache-Control": f"public, max-age={max_age}, stale-while-revalidate={max_age * 7}",
+			"ETag": etag,
+			"Vary": "Accept-Encoding",
+		}
+
+		if frappe.request.headers.get("If-None-Match") == etag:
+			return Response(status=304, headers=headers)
+
+		encoding, file_path = _negotiate_encoding(path, frappe.request.headers.get("Accept-Encoding", ""))
+		if encoding:
+			headers["Content-Encoding"] = encoding
+
+		with open(file_path, "rb") as f:
+			data = f.read()
+
+		return Response(
+			data, status=200, headers=headers, content_type=CONTENT_TYPES[os.path.splitext(path)[1]]
+		)
+
+
+def _mark_record(doc, was_published, is_published):
+	if not was_published and not is_published:
+		return
+
+	page = _page_of(doc)
+	# publishing or unpublishing changes which records the following pages hold
+	page_mark = f"page:{page}" if was_published == is_published else f"from:{page}"
+	marks = {"index", page_mark, f"shard:{shard_of(doc.name)}"}
+	frappe.db.after_commit.add(partial(_queue_build, doc.doctype, marks))
+
+
+def _queue_build(doctype, marks):
+	frappe.cache().pipeline().sadd(_dirty_key(doctype), *marks).execute()
+	frappe.enqueue(
+		"ml_modules.ml_modules.static_listing.build_dirty_pages",
+		queue="short",
+		job_id=f"ml_modules_static_listing::{doctype}",
+		deduplicate=True,
+		doctype=doctype,
+	)
+
+
+def _build(doctype, marks):
+	total_pages = _total_pages(doctype)
+	pages, shards, shifted = set(), set(), False
+
+	for mark in marks:
+		kind, _sep, value = mark.partition(":")
+		if kind == "page":
+			pages.add(cint(value))
+		elif kind == "from":
+			# the page before also changes when its "next" link appears or disappears
+			pages.update(range(max(cint(value) - 1, 1), total_pages + 1))
+			shifted = True
+		elif kind == "shard":
+			shards.add(cint(value))
+
+	for page in sorted(pages):
+		if page <= total_pages:
+			_render_listing_page(doctype, page, total_pages)
+
+	if shifted:
+		_remove_pages_after(doctype, total_pages)
+
+	if "index" in marks:
+		_render_listing_page(doctype, 0, total_pages)
+
+	for shard in sorted(shards):
+		_render_sitemap_shard(doctype, shard)
+
+
+def _render_listing_page(doctype, page, total_pages):
+	"""Render page `page` of the listing, page 0 being the index with the newest records"""
+	route = LISTING_ROUTES[doctype]
+	if page:
+		order_by, offset = "creation ASC, name ASC", (page - 1) * PAGE_SIZE
+	else:
+		order_by, offset = "creation DESC, name DESC", 0
+
+	rows = frappe.db.sql(
+		f"""
+		SELECT name, title, route
+		FROM `tab{doctype}`
+		WHERE published = 1
+		ORDER BY {order_by}
+		LIMIT %s OFFSET %s
+	""",
+		(PAGE_SIZE, offset),
+		as_dict=True,
+	)
+
+	html = frappe.render_template(
+		"ml_modules/templates/includes/demo_listing.html",
+		{
+			"title": doctype,
+			"rows": rows,
+			"page": page,
+			"total_pages": total_pages,
+			"base_route": route,
+			"canonical_url": get_url(f"/{route}/page/{page}" if page else f"/{route}"),
+		},
+	)
+	_store(_listing_path(route, page), html.encode())
+
+
+def _render_sitemap_shard(doctype, shard):
+	rows = frappe.db.sql(
+		f"""
+		SELECT route, modified
+		FROM `tab{doctype}`
+		WHERE published = 1 AND CRC32(name) %% %s = %s
+		ORDER BY name
+	""",
+		(SITEMAP_SHARDS, shard),
+		as_dict=True,
+	)
+
+	urls = "".join(
+		f"<url><loc>{escape(get_url('/' + row.route))}</loc><lastmod>{row.modified:%Y-%m-%d}</lastmod></url>"
+		for row in rows
+		if row.route
+	)
+	xml = (
+		'<?xml version="1.0" encoding="UTF-8"?>'
+		f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'
+	)
+	_store(_shard_path(doctype, shard), xml.encode())
+
+
+def _render_sitemap_index():
+	sitemaps = "".join(
+		f"<sitemap><loc>{escape(get_url('/' + _shard_route(doctype, shard)))}</loc></sitemap>"
+		for doctype in LISTING_ROUTES
+		for shard in range(SITEMAP_SHARDS)
+	)
+	xml = (
+		'<?xml version="1.0" encoding="UTF-8"?>'
+		f'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{sitemaps}</sitemapindex>'
+	)
+	_store(_sitemap_index_path(), xml.encode())
+
+
+def _store(relative_path, content):
+	"""Atomically write the raw file and its compressed variants, the raw file last"""
+	path = os.path.join(_static_dir(), relative_path)
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+
+	_write_atomic(path + ".gz", gzip.compress(content, compresslevel=9, mtime=0))
+	if brotli:
+		_write_atomic(path + ".br", brotli.compress(content, quality=11))
+	_write_atomic(path, content)
+
+
+def _write_atomic(path, content):
+	tmp_path = f"{path}.{os.getpid()}.tmp"
+	with open(tmp_path, "wb") as f:
+		f.write(content)
+	os.replace(tmp_path, path)
+
+
+def _remove_pages_after(doctype, total_pages):
+	page_dir = os.path.join(_static_dir(), LISTING_ROUTES[doctype], "page")
+	if not os.path.isdir(page_dir):
+		return
+
+	for filename in os.listdir(page_dir):
+		page = cint(filename.split(".", 1)[0])
+		if page > total_pages:
+			os.remove(os.path.join(page_dir, filename))
+
+
+def _resolve(path):
+	"""Map a request path to (kind, doctype, number), or None if it is not a static listing route"""
+	path = (path or "").strip("/")
+	if path == SITEMAP_INDEX_ROUTE:
+		return ("sitemap_index", None, None)
+
+	for doctype, route in LISTING_ROUTES.items():
+		# Frappe resolves the DocType's own route to the DocType name before the renderers run
+		if path in (route, doctype):
+			return ("page", doctype, 0)
+
+	if match := PAGE_ROUTE_PATTERN.match(path):
+		for doctype, route in LISTING_ROUTES.items():
+			if match["route"] == route and cint(match["page"]) > 0:
+				return ("page", doctype, cint(match["page"]))
+
+	if match := SHARD_ROUTE_PATTERN.match(path):
+		for doctype in LISTING_ROUTES:
+			if match["slug"] == _slug(doctype) and cint(match["shard"]) < SITEMAP_SHARDS:
+				return ("shard", doctype, cint(match["shard"]))
+
+	return None
+
+
+def _ensure_built(target):
+	"""Return the raw file path of a resolved route, rendering it first if it was never built"""
+	kind, doctype, number = target
+	if kind == "sitemap_index":
+		path = os.path.join(_static_dir(), _sitemap_index_path())
+		if not os.path.exists(path):
+			_render_sitemap_index()
+		return path
+
+	if kind == "shard":
+		path = os.path.join(_static_dir(), _shard_path(doctype, number))
+		if not os.path.exists(path):
+			_render_sitemap_shard(doctype, number)
+		return path
+
+	path = os.path.join(_static_dir(), _listing_path(LISTING_ROUTES[doctype], number))
+	if not os.path.exists(path):
+		total_pages = _total_pages(doctype)
+		if number > total_pages:
+			return None
+		_render_listing_page(doctype, number, total_pages)
+	return path
+
+
+def _negotiate_encoding(path, accept_encoding):
+	accepted = {token.split(";", 1)[0].strip() for token in accept_encoding.lower().split(",")}
+	for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+		if encoding in accepted and os.path.exists(path + suffix):
+			return encoding, path + suffix
+	return None, path
+
+
+def _page_of(doc):
+	"""Listing page of a record in publication order"""
+	before = frappe.db.sql(
+		f"""
+		SELECT COUNT(*)
+		FROM `tab{doc.doctype}`
+		WHERE published = 1 AND (creation < %(creation)s OR (creation = %(creation)s AND name < %(name)s))
+	""",
+		{"creation": doc.creation, "name": doc.name},
+	)[0][0]
+	return before // PAGE_SIZE + 1
+
+
+def _total_pages(doctype):
+	return math.ceil(frappe.db.count(doctype, {"published": 1}) / PAGE_SIZE)
+
+
+def _listing_path(route, page):
+	return os.path.join(route, "page", f"{page}.html") if page else os.path.join(route, "index.html")
+
+
+def _shard_path(doctype, shard):
+	return os.path.join("sitemaps", f"{_slug(doctype)}-{shard}.xml")
+
+
+def _sitemap_index_path():
+	return os.path.join("sitemaps", "index.xml")
+
+
+def _shard_route(doctype, shard):
+	return f"sitemap-ml-modules-{_slug(doctype)}-{shard}.xml"
+
+
+def _slug(doctype):
+	return frappe.scrub(doctype).replace("_", "-")
+
+
+def _dirty_key(doctype):
+	return frappe.cache().make_key(f"ml_modules:static_listing_dirty:{doctype}")
+
+
+def _static_dir():
+	return frappe.get_site_path("private", "ml_modules_static")
@@ -0,0 +1,135 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+import unittest
+
+import frappe
+from frappe.permissions import add_user_permission
+from frappe.tests.utils import FrappeTestCase
+
+from ml_modules.ml_modules.aggregation import aggregate, compile_query, normalize_spec
+
+
+class TestAggregation(FrappeTestCase):
+	"""
+	Test cases for the declarative aggregation API
+	"""
+
+	def setUp(self):
+		"""Set up test data"""
+		self.test_title = "Test Aggregation Record"
+		for index, (moto_type, capacity) in enumerate([("Sport", 600), ("Sport", 1000), ("Cruiser", 1600)]):
+			frappe.get_doc(
+				{
+					"doctype": "Moto Demo",
+					"title": f"{self.test_title} {index}",
+					"status": "Active",
+					"moto_type": moto_type,
+					"engine_capacity": capacity,
+					"demo_date": "2024-03-15",
+				}
+			).insert()
+		frappe.db.commit()
+
+	def tearDown(self):
+		"""Clean up test data"""
+		frappe.db.delete("Moto Demo", {"title": ("like", self.test_title + "%")})
+		frappe.db.commit()
+
+	def test_aggregate_by_type(self):
+		"""Test grouping with measures and filters"""
+		rows = aggregate(
+			"Moto Demo",
+			group_by=["moto_type"],
+			filters={"title": ["like", self.test_title + "%"]},
+			measures=["count", "avg:engine_capacity", "max:engine_capacity"],
+			date_bucket="month",
+		)
+		by_type = {row.moto_type: row for row in rows}
+
+		self.assertEqual(by_type["Sport"]["count"], 2)
+		self.assertEqual(by_type["Sport"]["avg_engine_capacity"], 800)
+		self.assertEqual(by_type["Cruiser"]["max_engine_capacity"], 1600)
+		self.assertEqual(str(by_type["Sport"]["bucket"]), "2024-03-01")
+
+	def test_cache_invalidated_on_write(self):
+		"""Test that cached results are dropped when the doctype is written"""
+		filters = {"title": ["like", self.test_title + "%"]}
+		self.assertEqual(aggregate("Moto Demo", filters=filters)[0]["count"], 3)
+
+		frappe.get_doc(
+			{
+				"doctype": "Moto Demo",
+				"title": f"{self.test_title} New",
+				"moto_type": "Naked",
+				"engine_capacity": 650,
+			}
+		).insert()
+		frappe.db.commit()
+
+		self.assertEqual(aggregate("Moto Demo", filters=filters)[0]["count"], 4)
+
+	def test_user_permissions_respected(self):
+		"""Test that users only aggregate the records they may read and do not share cached results"""
+		filters = {"title": ["like", self.test_title + "%"]}
+		self.assertEqual(aggregate("Moto Demo", filters=filters)[0]["count"], 3)
+
+		user = "test_aggregation@example.com"
+		if not frappe.db.exists("User", user):
+			frappe.get_doc({"doctype": "User", "email": user, "first_name": "Aggregation"}).insert(
+				ignore_permissions=True
+			)
+		name = frappe.db.get_value("Moto Demo", {"title": f"{self.test_title} 0"})
+		add_user_permission("Moto Demo", name, user)
+
+		frappe.set_user(user)
+		try:
+			rows = aggregate("Moto Demo", filters=filters)
+		finally:
+			frappe.set_user("Administrator")
+			frappe.db.delete("User Permission", {"user": user})
+			frappe.db.commit()
+
+		self.assertEqual(rows[0]["count"], 1)
+
+	def test_invalid_specs(self):
+		"""Test that fields and functions are checked against the meta"""
+		with self.assertRaises(frappe.ValidationError):
+			normalize_spec("Moto Demo", group_by=["not_a_field"])
+
+		with self.assertRaises(frappe.ValidationError):
+			normalize_spec("Moto Demo", measures=["sum:title"])
+
+		with self.assertRaises(frappe.ValidationError):
+			normalize_spec("Lamaa Demo", measures=["avg:engine_capacity"])
+
+		with self.assertRaises(frappe.ValidationError):
+			normalize_spec("Moto Demo", filters=[["moto_type", "="]])
+
+		with self.assertRaises(frappe.ValidationError):
+			normalize_spec("Moto Demo", filters="{not json")
+
+	def test_spec_forms(self):
+		"""Test that plain strings and Frappe's list form of filters are accepted"""
+		spec = normalize_spec("Moto Demo", group_by="moto_type", measures="count")
+		self.assertEqual(spec["group_by"], ["moto_type"])
+		self.assertEqual(spec["measures"], [["count", None]])
+
+		as_dict = normalize_spec("Moto Demo", filters={"moto_type": "Sport", "status": ["in", ["Active"]]})
+		as_list = normalize_spec(
+			"Moto Demo",
+			filters=[["Moto Demo", "status", "in", ["Active"]], ["moto_type", "=", "Sport"]],
+		)
+		self.assertEqual(as_list["filters"], as_dict["filters"])
+
+	def test_compiled_query_is_parameterized(self):
+		"""Test that filter values are passed as parameters"""
+		spec = normalize_spec("Moto Demo", group_by=["status"], filters={"moto_type": ["in", ["Sport"]]})
+		query, values = compile_query("Moto Demo", spec)
+
+		self.assertNotIn("Sport", query)
+		self.assertEqual(values["f0"], ("Sport",))
+
+
+if __name__ == "__main__":
+	unittest.main()
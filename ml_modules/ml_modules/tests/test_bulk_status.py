@@ -0,0 +1,92 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+import unittest
+
+import frappe
+from frappe.permissions import add_user_permission
+from frappe.tests.utils import FrappeTestCase
+
+from ml_modules.ml_modules.bulk_status import bulk_transition_status
+
+
+class TestBulkStatus(FrappeTestCase):
+	"""
+	Test cases for bulk status transitions
+	"""
+
+	def setUp(self):
+		"""Set up test data"""
+		self.test_title = "Test Bulk Status Record"
+		self.names = []
+		for index, status in enumerate(["Active", "Active", "Draft", "Completed"]):
+			doc = frappe.get_doc(
+				{
+					"doctype": "Moto Demo",
+					"title": f"{self.test_title} {index}",
+					"status": status,
+					"moto_type": "Touring",
+					"engine_capacity": 1200,
+				}
+			)
+			doc.insert()
+			self.names.append(doc.name)
+		frappe.db.commit()
+
+	def tearDown(self):
+		"""Clean up test data"""
+		frappe.db.delete("Moto Demo", {"title": ("like", self.test_title + "%")})
+		frappe.db.delete("Version", {"ref_doctype": "Moto Demo", "docname": ("in", self.names)})
+		frappe.db.commit()
+
+	def test_transition_by_names(self):
+		"""Test that only records allowed to move are transitioned"""
+		result = bulk_transition_status("Moto Demo", "Completed", names=self.names, chunk_size=2)
+
+		self.assertEqual(result["updated"], 3)
+		self.assertEqual(result["skipped"], 1)
+		self.assertEqual(frappe.db.get_value("Moto Demo", self.names[0], "status"), "Completed")
+		self.assertEqual(frappe.db.get_value("Moto Demo", self.names[2], "status"), "Completed")
+		self.assertTrue(frappe.db.exists("Version", {"ref_doctype": "Moto Demo", "docname": self.names[0]}))
+
+	def test_transition_by_filters(self):
+		"""Test that filters select the records to transition"""
+		result = bulk_transition_status(
+			"Moto Demo", "Active", filters={"title": ["like", self.test_title + "%"], "status": "Draft"}
+		)
+
+		self.assertEqual(result["updated"], 1)
+		self.assertEqual(frappe.db.get_value("Moto Demo", self.names[2], "status"), "Active")
+
+	def test_user_permissions_respected(self):
+		"""Test that records outside the user's User Permissions are not transitioned"""
+		user = "test_bulk_status@example.com"
+		if not frappe.db.exists("User", user):
+			frappe.get_doc({"doctype": "User", "email": user, "first_name": "Bulk Status"}).insert(
+				ignore_permissions=True
+			)
+		add_user_permission("Moto Demo", self.names[0], user)
+
+		frappe.set_user(user)
+		try:
+			result = bulk_transition_status("Moto Demo", "Inactive", names=self.names[:2])
+		finally:
+			frappe.set_user("Administrator")
+			frappe.db.delete("User Permission", {"user": user})
+			frappe.db.commit()
+
+		self.assertEqual(result["updated"], 1)
+		self.assertEqual(frappe.db.get_value("Moto Demo", self.names[0], "status"), "Inactive")
+		self.assertEqual(frappe.db.get_value("Moto Demo", self.names[1], "status"), "Active")
+
+	def test_invalid_requests(self):
+		"""Test that invalid statuses and unbounded requests are rejected"""
+		with self.assertRaises(frappe.ValidationError):
+			bulk_transition_status("Moto Demo", "Archived", names=self.names)
+
+		with self.assertRaises(frappe.ValidationError):
+			bulk_transition_status("Moto Demo", "Completed")
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,84 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+import time
+import unittest
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from ml_modules.ml_modules import caching
+from ml_modules.ml_modules.caching import swr_cache
+
+calls = []
+
+
+@swr_cache(ttl=60, tags=("Test Caching Tag",), lock_timeout=1)
+def count_calls(value, multiplier=1):
+	"""Cached function used by the tests"""
+	calls.append(value)
+	return value * multiplier
+
+
+class TestCaching(FrappeTestCase):
+	"""
+	Test cases for the stale-while-revalidate cache
+	"""
+
+	def setUp(self):
+		"""Start every test with an empty cache"""
+		calls.clear()
+		caching._new_tag_versions(("Test Caching Tag",))
+
+	def test_cached_per_arguments(self):
+		"""Test that equivalent calls share one result"""
+		self.assertEqual(count_calls(2), 2)
+		self.assertEqual(count_calls(value=2, multiplier=1), 2)
+		self.assertEqual(count_calls(2, multiplier=3), 6)
+		self.assertEqual(calls, [2, 2])
+
+	def test_tag_invalidation(self):
+		"""Test that invalidating a tag drops its results after commit"""
+		count_calls(5)
+		caching.invalidate_tags("Test Caching Tag")
+		count_calls(5)
+		self.assertEqual(len(calls), 1)
+
+		frappe.db.commit()
+		count_calls(5)
+		self.assertEqual(len(calls), 2)
+
+	def test_stale_result_served(self):
+		"""Test that an expired result is served while a refresh job replaces it"""
+		count_calls(7)
+		key = caching._entry_key(
+			f"{__name__}.count_calls", {"value": 7, "multiplier": 1}, ("Test Caching Tag",)
+		)
+		frappe.cache().set_value(key, {"value": "stale", "fresh_until": time.time() - 1}, expires_in_sec=60)
+
+		self.assertEqual(count_calls(7), "stale")
+
+		# the refresh job runs inline in tests
+		self.assertEqual(calls, [7, 7])
+		self.assertEqual(count_calls(7), 7)
+
+		# and releases its lock
+		token = caching._acquire_lock(key, 1)
+		self.assertTrue(token)
+		caching._release_lock(key, token)
+
+	def test_waits_for_lock_holder(self):
+		"""Test that a caller gives up waiting after the lock timeout and computes the result"""
+		key = caching._entry_key(
+			f"{__name__}.count_calls", {"value": 9, "multiplier": 1}, ("Test Caching Tag",)
+		)
+		token = caching._acquire_lock(key, 1)
+		self.assertTrue(token)
+
+		self.assertEqual(count_calls(9), 9)
+		self.assertEqual(calls, [9])
+		caching._release_lock(key, token)
+
+
+if __name__ == "__main__":
+	unittest.main()
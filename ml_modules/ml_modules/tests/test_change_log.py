@@ -0,0 +1,71 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+import unittest
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from ml_modules.ml_modules.bulk_status import bulk_transition_status
+from ml_modules.ml_modules.change_log import get_changes
+
+
+class TestChangeLog(FrappeTestCase):
+	"""
+	Test cases for the change-data-capture feed
+	"""
+
+	def setUp(self):
+		"""Set up test data"""
+		self.test_title = "Test Change Log Record"
+		frappe.conf.ml_modules_change_log_visibility_lag = 0
+		self.cursor = frappe.db.sql("SELECT IFNULL(MAX(name), 0) FROM `tabDemo Change Log`")[0][0]
+
+	def tearDown(self):
+		"""Clean up test data"""
+		frappe.conf.pop("ml_modules_change_log_visibility_lag", None)
+		frappe.db.delete("Lamaa Demo", {"title": ("like", self.test_title + "%")})
+		frappe.db.delete("Demo Change Log", {"name": (">", self.cursor)})
+		frappe.db.commit()
+
+	def test_document_lifecycle(self):
+		"""Test that each write is logged once with the changed fields"""
+		doc = frappe.get_doc({"doctype": "Lamaa Demo", "title": self.test_title, "priority": "Low"}).insert()
+		doc.save()
+		doc.priority = "High"
+		doc.save()
+		frappe.rename_doc("Lamaa Demo", doc.name, f"{self.test_title} Renamed")
+		frappe.delete_doc("Lamaa Demo", f"{self.test_title} Renamed")
+
+		changes = get_changes(since=self.cursor, doctype="Lamaa Demo")["changes"]
+		self.assertEqual(
+			[change["operation"] for change in changes], ["Insert", "Update", "Rename", "Delete"]
+		)
+		self.assertEqual(changes[0]["data"]["priority"], "Low")
+		self.assertEqual(changes[1]["data"], {"priority": "High"})
+		self.assertEqual(changes[2]["old_name"], self.test_title)
+		self.assertEqual(sorted(change["seq"] for change in changes), [change["seq"] for change in changes])
+
+	def test_paging_and_bulk_updates(self):
+		"""Test that bulk transitions are logged and pages follow the cursor"""
+		names = [
+			frappe.get_doc({"doctype": "Lamaa Demo", "title": f"{self.test_title} {index}"}).insert().name
+			for index in range(3)
+		]
+		bulk_transition_status("Lamaa Demo", "Active", names=names)
+
+		page = get_changes(since=self.cursor, limit=4, doctype="Lamaa Demo")
+		self.assertTrue(page["has_more"])
+		self.assertFalse(page["resync_required"])
+
+		page = get_changes(since=page["cursor"], limit=4, doctype="Lamaa Demo")
+		self.assertFalse(page["has_more"])
+		self.assertEqual(len(page["changes"]), 2)
+		self.assertEqual(page["changes"][-1]["data"]["status"], "Active")
+
+		frappe.conf.ml_modules_change_log_visibility_lag = 3600
+		self.assertEqual(get_changes(since=self.cursor)["changes"], [])
+
+
+if __name__ == "__main__":
+	unittest.main()
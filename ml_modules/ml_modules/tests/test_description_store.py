@@ -0,0 +1,121 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+import unittest
+
+import frappe
+import frappe.client
+from frappe.tests.utils import FrappeTestCase
+
+from ml_modules.ml_modules.description_store import (
+	compress_descriptions,
+	delete_unreferenced_blobs,
+	get_description,
+	store_description,
+)
+
+
+class TestDescriptionStore(FrappeTestCase):
+	"""
+	Test cases for the compressed description storage
+	"""
+
+	def setUp(self):
+		"""Set up test data"""
+		self.test_title = "Test Description Store Record"
+		self.test_description = "<p>Spec sheet</p>" * 200
+
+	def tearDown(self):
+		"""Clean up test data"""
+		frappe.db.delete("Moto Demo", {"title": ("like", self.test_title + "%")})
+		frappe.db.commit()
+
+	def test_description_moved_to_blob(self):
+		"""Test that the demo row only keeps the hash and identical bodies share a blob"""
+		names = []
+		for index in range(2):
+			names.append(
+				frappe.get_doc(
+					{
+						"doctype": "Moto Demo",
+						"title": f"{self.test_title} {index}",
+						"description": self.test_description,
+					}
+				)
+				.insert()
+				.name
+			)
+
+		rows = frappe.get_all(
+			"Moto Demo", filters={"name": ["in", names]}, fields=["description", "description_hash"]
+		)
+		self.assertFalse(any(row.description for row in rows))
+		self.assertEqual(len({row.description_hash for row in rows}), 1)
+
+		blob = frappe.db.get_value(
+			"Demo Description Blob",
+			rows[0].description_hash,
+			["codec", "raw_size", "stored_size"],
+			as_dict=True,
+		)
+		self.assertEqual(blob.codec, "zlib")
+		self.assertLess(blob.stored_size, blob.raw_size)
+
+	def test_lazy_load_and_update(self):
+		"""Test that the description is loaded on access and survives saves that do not touch it"""
+		name = (
+			frappe.get_doc(
+				{"doctype": "Moto Demo", "title": self.test_title, "description": self.test_description}
+			)
+			.insert()
+			.name
+		)
+
+		doc = frappe.get_doc("Moto Demo", name)
+		self.assertIsNone(doc.get("description"))
+		doc.status = "Active"
+		doc.save()
+		self.assertEqual(frappe.get_doc("Moto Demo", name).description, self.test_description)
+
+		doc = frappe.get_doc("Moto Demo", name)
+		doc.description = "<p>Short</p>"
+		doc.save()
+		self.assertEqual(frappe.get_doc("Moto Demo", name).as_dict().description, "<p>Short</p>")
+
+	def test_set_value_replaces_description(self):
+		"""Test that descriptions written through set/update reach the blob"""
+		name = (
+			frappe.get_doc(
+				{"doctype": "Moto Demo", "title": self.test_title, "description": self.test_description}
+			)
+			.insert()
+			.name
+		)
+
+		frappe.client.set_value("Moto Demo", name, "description", "<p>New spec sheet</p>")
+		self.assertEqual(frappe.get_doc("Moto Demo", name).description, "<p>New spec sheet</p>")
+
+		doc = frappe.get_doc("Moto Demo", name)
+		doc.update({"description": "<p>Updated spec sheet</p>"})
+		doc.save()
+		self.assertEqual(frappe.get_doc("Moto Demo", name).description, "<p>Updated spec sheet</p>")
+
+	def test_migrate_and_collect(self):
+		"""Test the backfill method for plain columns and the removal of unreferenced blobs"""
+		name = frappe.get_doc({"doctype": "Moto Demo", "title": self.test_title}).insert().name
+		frappe.db.set_value("Moto Demo", name, "description", self.test_description)
+
+		self.assertEqual(compress_descriptions("Moto Demo", [name]), 1)
+		description_hash = frappe.db.get_value("Moto Demo", name, "description_hash")
+		self.assertEqual(get_description(description_hash), self.test_description)
+
+		orphan = store_description("<p>Nobody uses this</p>")
+		frappe.db.set_value("Demo Description Blob", orphan, "modified", "2000-01-01", update_modified=False)
+		delete_unreferenced_blobs()
+
+		self.assertFalse(frappe.db.exists("Demo Description Blob", orphan))
+		self.assertTrue(frappe.db.exists("Demo Description Blob", description_hash))
+
+
+if __name__ == "__main__":
+	unittest.main()
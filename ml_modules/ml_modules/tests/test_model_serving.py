@@ -0,0 +1,110 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+import unittest
+
+import frappe
+from frappe.permissions import add_user_permission
+from frappe.tests.utils import FrappeTestCase
+
+from ml_modules.ml_modules.model_serving import PRIOR_VERSION, _load_model, score_moto_demos, score_record
+from ml_modules.ml_modules.moto_type_model import MotoTypeModel
+from ml_modules.ml_modules.utils import ENGINE_CAPACITY_RANGES
+
+
+class TestModelServing(FrappeTestCase):
+	"""
+	Test cases for the engine capacity model and its serving layer
+	"""
+
+	def test_fit_and_score(self):
+		"""Test that single and batch scoring agree"""
+		model = MotoTypeModel.fit(
+			["Sport", "Sport", "Scooter", "Cruiser"], [600, 1000, 125, 1600], ENGINE_CAPACITY_RANGES
+		)
+
+		anomaly_score, suggestion, _confidence = model.score_one("Sport", 50)
+		self.assertGreater(anomaly_score, 3)
+		self.assertIsNone(suggestion)
+
+		_anomaly_score, suggestion, confidence = model.score_one(None, 125)
+		self.assertEqual(suggestion, "Scooter")
+		self.assertGreater(confidence, 0.5)
+
+		anomaly_scores, suggestions, _confidences = model.score(["Sport", None], [50, 125])
+		self.assertAlmostEqual(anomaly_scores[0], model.score_one("Sport", 50)[0])
+		self.assertEqual(suggestions[1], "Scooter")
+
+	def test_artifact_round_trip(self):
+		"""Test that a serialized model keeps its version and parameters"""
+		model = MotoTypeModel.fit(["Naked"], [650], ENGINE_CAPACITY_RANGES)
+		loaded = MotoTypeModel.from_dict(model.as_dict())
+
+		self.assertEqual(loaded.version, model.version)
+		self.assertEqual(loaded.score_one("Naked", 700), model.score_one("Naked", 700))
+
+	def test_prior_version_is_stable(self):
+		"""Test that the fallback model has the same version in every process"""
+		prior = _load_model(PRIOR_VERSION)
+		self.assertEqual(prior.version, PRIOR_VERSION)
+		self.assertIsNone(prior.trained_at)
+		self.assertEqual(
+			prior.score_one("Naked", 650),
+			MotoTypeModel.fit([], [], ENGINE_CAPACITY_RANGES).score_one("Naked", 650),
+		)
+
+	def test_score_record_and_batch_endpoint(self):
+		"""Test scoring through the serving layer"""
+		result = score_record("Scooter", 125)
+		self.assertFalse(result.is_anomaly)
+		self.assertTrue(result.model_version)
+
+		response = score_moto_demos(
+			records=[
+				{"name": "a", "moto_type": "Touring", "engine_capacity": 60},
+				{"name": "b", "moto_type": None, "engine_capacity": 1000},
+				{"name": "c", "moto_type": "Electric", "engine_capacity": None},
+			]
+		)
+		results = {row["name"]: row for row in response["results"]}
+
+		self.assertTrue(results["a"]["is_anomaly"])
+		self.assertTrue(results["b"]["suggested_moto_type"])
+		self.assertIsNone(results["c"]["anomaly_score"])
+
+	def test_scoring_by_name_respects_user_permissions(self):
+		"""Test that records outside the user's User Permissions are not scored"""
+		names = [
+			frappe.get_doc(
+				{
+					"doctype": "Moto Demo",
+					"title": f"Test Model Serving Record {index}",
+					"moto_type": "Sport",
+					"engine_capacity": 600,
+				}
+			)
+			.insert()
+			.name
+			for index in range(2)
+		]
+		user = "test_model_serving@example.com"
+		if not frappe.db.exists("User", user):
+			frappe.get_doc({"doctype": "User", "email": user, "first_name": "Model Serving"}).insert(
+				ignore_permissions=True
+			)
+		add_user_permission("Moto Demo", names[0], user)
+
+		frappe.set_user(user)
+		try:
+			response = score_moto_demos(names=names)
+		finally:
+			frappe.set_user("Administrator")
+			frappe.db.delete("User Permission", {"user": user})
+			frappe.db.delete("Moto Demo", {"name": ("in", names)})
+			frappe.db.commit()
+
+		self.assertEqual([row["name"] for row in response["results"]], [names[0]])
+
+
+if __name__ == "__main__":
+	unittest.main()
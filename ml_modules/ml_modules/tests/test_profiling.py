@@ -0,0 +1,86 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+import json
+import unittest
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from ml_modules.ml_modules.doctype.moto_demo.moto_demo import get_moto_stats
+from ml_modules.ml_modules.profiling import (
+	RequestProfile,
+	download_profile,
+	list_profiles,
+	matches,
+	track_connection,
+)
+
+
+class StubConnection:
+	"""Stands in for a replica connection"""
+
+	def sql(self, query, *args, **kwargs):
+		return []
+
+
+class TestProfiling(FrappeTestCase):
+	"""
+	Test cases for the request profiler
+	"""
+
+	def test_matches(self):
+		"""Test the method, doctype, user and sample rate filters"""
+		conf = {"methods": ["get_moto_stats"], "doctypes": ["Moto Demo"], "users": ["Administrator"]}
+		method = "ml_modules.ml_modules.doctype.moto_demo.moto_demo.get_moto_stats"
+
+		self.assertTrue(matches(conf, method, None, "Administrator"))
+		self.assertTrue(matches(conf, "frappe.desk.form.save.savedocs", "Moto Demo", "Administrator"))
+		self.assertFalse(matches(conf, "frappe.desk.form.save.savedocs", "Lamaa Demo", "Administrator"))
+		self.assertFalse(matches(conf, method, None, "Guest"))
+		self.assertFalse(matches({"sample_rate": 0}, method, None, "Administrator"))
+
+	def test_replica_queries_logged(self):
+		"""Test that queries on a tracked connection are logged with its label"""
+		replica = StubConnection()
+		profile = frappe.local.ml_modules_profile = RequestProfile({})
+		try:
+			profile.start()
+			track_connection(replica, "replica")
+			replica.sql("SELECT 1")
+			profile.stop()
+		finally:
+			frappe.local.ml_modules_profile = None
+
+		self.assertIn(
+			{"query": "SELECT 1", "connection": "replica"},
+			[{"query": query["query"], "connection": query["connection"]} for query in profile.queries],
+		)
+		self.assertNotIn("sql", replica.__dict__)
+
+	def test_capture_and_download(self):
+		"""Test that both modes store the profile and the query log"""
+		names = []
+		for mode in ("cprofile", "sampling"):
+			profile = RequestProfile({"mode": mode, "retention": 1}, "get_moto_stats")
+			profile.start()
+			# the cached wrapper would serve the second iteration without queries
+			get_moto_stats.uncached()
+			profile.stop()
+			self.assertNotIn("sql", frappe.local.db.__dict__)
+			self.assertTrue(any("tabMoto Demo" in query["query"] for query in profile.queries))
+			names.append(profile.save())
+
+		# the retention of 1 removed the first artifact
+		self.assertEqual([row["name"] for row in list_profiles()], names[1:])
+
+		download_profile(names[1])
+		artifact = json.loads(frappe.local.response.filecontent)
+		self.assertEqual(artifact["mode"], "sampling")
+		self.assertIn("stacks", artifact)
+
+		self.assertRaises(frappe.DoesNotExistError, download_profile, "../site_config.json")
+
+
+if __name__ == "__main__":
+	unittest.main()
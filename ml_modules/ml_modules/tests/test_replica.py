@@ -0,0 +1,45 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+import unittest
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from ml_modules.ml_modules.replica import replica_read, should_read_from_replica
+
+
+@replica_read()
+def read_current_db():
+	return frappe.local.db
+
+
+class TestReplicaRouting(FrappeTestCase):
+	"""
+	Test cases for read-replica routing
+	"""
+
+	def tearDown(self):
+		"""Reset the replica configuration"""
+		frappe.local.conf.pop("read_from_replica", None)
+		frappe.local.conf.pop("replica_host", None)
+		frappe.cache().delete_value("ml_modules:replica_health")
+
+	def test_primary_without_replica_config(self):
+		"""Test that reads stay on the primary when no replica is configured"""
+		self.assertFalse(should_read_from_replica())
+		self.assertIs(read_current_db(), frappe.local.db)
+
+	def test_fallback_when_replica_is_down(self):
+		"""Test that an unreachable replica falls back to the primary"""
+		frappe.local.conf.read_from_replica = 1
+		frappe.local.conf.replica_host = "127.0.0.254"
+		primary = frappe.local.db
+
+		self.assertIs(read_current_db(), primary)
+		self.assertEqual(frappe.cache().get_value("ml_modules:replica_health"), "down")
+		self.assertFalse(should_read_from_replica())
+
+
+if __name__ == "__main__":
+	unittest.main()
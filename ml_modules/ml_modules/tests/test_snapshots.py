@@ -0,0 +1,107 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+import unittest
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from ml_modules.ml_modules import snapshots
+
+
+@unittest.skipUnless(snapshots.pa, "pyarrow is not installed")
+class TestSnapshots(FrappeTestCase):
+	"""
+	Test cases for the columnar snapshots
+	"""
+
+	def setUp(self):
+		"""Set up test data"""
+		self.test_title = "Test Snapshot Record"
+		frappe.conf.ml_modules_change_log_visibility_lag = 0
+		for index, (moto_type, capacity) in enumerate([("Sport", 600), ("Sport", 1000), ("Cruiser", 1600)]):
+			frappe.get_doc(
+				{
+					"doctype": "Moto Demo",
+					"title": f"{self.test_title} {index}",
+					"moto_type": moto_type,
+					"engine_capacity": capacity,
+				}
+			).insert()
+		frappe.db.commit()
+
+	def tearDown(self):
+		"""Clean up test data"""
+		frappe.conf.pop("ml_modules_change_log_visibility_lag", None)
+		frappe.db.delete("Moto Demo", {"title": ("like", self.test_title + "%")})
+		frappe.db.commit()
+
+	def get_test_rows(self):
+		table = snapshots.read_snapshot("Moto Demo", ["name", "moto_type", "engine_capacity"])
+		return {row["name"]: row for row in table.to_pylist() if row["name"].startswith(self.test_title)}
+
+	def test_incremental_build_and_compaction(self):
+		"""Test that deltas follow updates, deletes and renames and survive compaction"""
+		snapshots.build_snapshot("Moto Demo", full=True)
+		self.assertEqual(len(self.get_test_rows()), 3)
+
+		doc = frappe.get_doc("Moto Demo", f"{self.test_title} 0")
+		doc.engine_capacity = 750
+		doc.save()
+		frappe.delete_doc("Moto Demo", f"{self.test_title} 1")
+		frappe.rename_doc("Moto Demo", f"{self.test_title} 2", f"{self.test_title} Renamed")
+		frappe.db.commit()
+
+		manifest = snapshots.build_snapshot("Moto Demo")
+		self.assertEqual(len(manifest["deltas"]), 1)
+
+		rows = self.get_test_rows()
+		self.assertEqual(sorted(rows), [f"{self.test_title} 0", f"{self.test_title} Renamed"])
+		self.assertEqual(rows[f"{self.test_title} 0"]["engine_capacity"], 750)
+
+		manifest = snapshots.compact_snapshot("Moto Demo")
+		self.assertEqual(manifest["deltas"], [])
+		self.assertEqual(self.get_test_rows(), rows)
+
+	def test_update_then_rename(self):
+		"""Test that a record updated and renamed in one window leaves no row under its old name"""
+		snapshots.build_snapshot("Moto Demo", full=True)
+
+		doc = frappe.get_doc("Moto Demo", f"{self.test_title} 0")
+		doc.engine_capacity = 800
+		doc.save()
+		frappe.rename_doc("Moto Demo", doc.name, f"{self.test_title} Moved")
+		frappe.db.commit()
+
+		snapshots.build_snapshot("Moto Demo")
+		rows = self.get_test_rows()
+		self.assertNotIn(f"{self.test_title} 0", rows)
+		self.assertEqual(rows[f"{self.test_title} Moved"]["engine_capacity"], 800)
+
+		snapshots.compact_snapshot("Moto Demo")
+		self.assertNotIn(f"{self.test_title} 0", self.get_test_rows())
+
+	def test_column_projection(self):
+		"""Test that only the requested columns are returned, with and without deltas"""
+		snapshots.build_snapshot("Moto Demo", full=True)
+		self.assertEqual(snapshots.read_snapshot("Moto Demo", ["moto_type"]).column_names, ["moto_type"])
+
+		frappe.delete_doc("Moto Demo", f"{self.test_title} 1")
+		frappe.db.commit()
+		snapshots.build_snapshot("Moto Demo")
+
+		table = snapshots.read_snapshot("Moto Demo", ["engine_capacity", "name"])
+		self.assertEqual(table.column_names, ["engine_capacity", "name"])
+		self.assertNotIn(f"{self.test_title} 1", table.column("name").to_pylist())
+
+	def test_aggregate_snapshot(self):
+		"""Test grouping a snapshot"""
+		snapshots.build_snapshot("Moto Demo", full=True)
+		rows = snapshots.aggregate_snapshot("Moto Demo", ["moto_type"], [("engine_capacity", "max")])
+		by_type = {row["moto_type"]: row for row in rows}
+
+		self.assertGreaterEqual(by_type["Cruiser"]["engine_capacity_max"], 1600)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,92 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+import gzip
+import os
+import unittest
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import set_request
+from frappe.website.path_resolver import PathResolver
+from frappe.website.serve import get_response
+
+from ml_modules.ml_modules import static_listing
+
+
+class TestStaticListing(FrappeTestCase):
+	"""
+	Test cases for the pre-rendered listing pages and sitemaps
+	"""
+
+	def setUp(self):
+		"""Set up test data"""
+		self.test_title = "Test Static Listing Record"
+		self.doc = frappe.get_doc(
+			{"doctype": "Lamaa Demo", "title": self.test_title, "published": 1}
+		).insert()
+		frappe.db.commit()
+
+	def tearDown(self):
+		"""Clean up test data"""
+		frappe.db.delete("Lamaa Demo", {"title": self.test_title})
+		frappe.db.commit()
+
+	def test_route_is_set_when_published(self):
+		"""Test that published demos get a route under the listing route"""
+		self.assertTrue(self.doc.route.startswith("lamaa-demos/"))
+
+	def test_resolve_routes(self):
+		"""Test that only listing and sitemap routes are claimed by the renderer"""
+		self.assertEqual(static_listing._resolve("lamaa-demos"), ("page", "Lamaa Demo", 0))
+		self.assertEqual(static_listing._resolve("Lamaa Demo"), ("page", "Lamaa Demo", 0))
+		self.assertEqual(static_listing._resolve("/moto-demos/page/3"), ("page", "Moto Demo", 3))
+		self.assertEqual(
+			static_listing._resolve("sitemap-ml-modules-moto-demo-2.xml"), ("shard", "Moto Demo", 2)
+		)
+		self.assertIsNone(static_listing._resolve("moto-demos/some-record"))
+		self.assertIsNone(
+			static_listing._resolve(f"sitemap-ml-modules-moto-demo-{static_listing.SITEMAP_SHARDS}.xml")
+		)
+
+	def test_listing_and_record_pages_served(self):
+		"""Test that the listing index reaches the renderer and record pages render"""
+		for route in static_listing.LISTING_ROUTES.values():
+			set_request(method="GET", path=f"/{route}")
+			_endpoint, renderer = PathResolver(route).resolve()
+			self.assertIsInstance(renderer, static_listing.PrecompressedPageRenderer)
+
+		frappe.set_user("Guest")
+		try:
+			set_request(method="GET", path=f"/{self.doc.route}")
+			response = get_response()
+		finally:
+			frappe.set_user("Administrator")
+
+		self.assertEqual(response.status_code, 200)
+		self.assertIn(self.test_title, frappe.safe_decode(response.get_data()))
+
+	def test_build_writes_compressed_variants(self):
+		"""Test that rebuilding writes raw and gzipped pages containing the record"""
+		static_listing.build_dirty_pages("Lamaa Demo")
+		static_listing.rebuild_static_listings("Lamaa Demo")
+
+		index_path = static_listing._ensure_built(("page", "Lamaa Demo", 0))
+		with open(index_path, "rb") as f:
+			raw = f.read()
+		with open(index_path + ".gz", "rb") as f:
+			self.assertEqual(gzip.decompress(f.read()), raw)
+		self.assertIn(self.test_title.encode(), raw)
+
+		shard_path = static_listing._ensure_built(
+			("shard", "Lamaa Demo", static_listing.shard_of(self.doc.name))
+		)
+		with open(shard_path, "rb") as f:
+			self.assertIn(self.doc.route.encode(), f.read())
+
+		self.assertIsNone(static_listing._ensure_built(("page", "Lamaa Demo", 10**6)))
+		self.assertTrue(os.path.exists(static_listing._ensure_built(("sitemap_index", None, None))))
+
+
+if __name__ == "__main__":
+	unittest.main()
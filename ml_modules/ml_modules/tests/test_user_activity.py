@@ -0,0 +1,111 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+import unittest
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from ml_modules.ml_modules.user_activity import (
+	_counts_key,
+	apply_activity,
+	get_user_counts,
+	get_user_demo_summary,
+)
+
+
+class TestUserActivity(FrappeTestCase):
+	"""
+	Test cases for the per-user activity index
+	"""
+
+	def setUp(self):
+		"""Set up test data"""
+		self.test_title = "Test User Activity Record"
+
+	def tearDown(self):
+		"""Clean up test data"""
+		frappe.db.delete("Moto Demo", {"title": ("like", self.test_title + "%")})
+		frappe.db.commit()
+
+	def make_demo(self, suffix, status="Draft"):
+		doc = frappe.get_doc(
+			{
+				"doctype": "Moto Demo",
+				"title": f"{self.test_title} {suffix}",
+				"status": status,
+				"moto_type": "Naked",
+				"engine_capacity": 650,
+			}
+		)
+		doc.insert()
+		frappe.db.commit()
+		return doc
+
+	def test_rebuilt_and_cached_counts_match(self):
+		"""Test that a rebuild returns the same shape as a cache hit"""
+		self.make_demo("Shape")
+		frappe.cache().pipeline().delete(_counts_key("Moto Demo", frappe.session.user)).execute()
+
+		rebuilt = get_user_counts(frappe.session.user, "Moto Demo")
+		self.assertEqual(get_user_counts(frappe.session.user, "Moto Demo"), rebuilt)
+		self.assertNotIn(None, rebuilt)
+
+	def test_counts_follow_status_changes(self):
+		"""Test that cached counts are adjusted incrementally"""
+		before = get_user_counts(frappe.session.user, "Moto Demo")
+
+		doc = self.make_demo("Counts")
+		counts = get_user_counts(frappe.session.user, "Moto Demo")
+		self.assertEqual(counts.get("Draft", 0), before.get("Draft", 0) + 1)
+
+		doc.status = "Active"
+		doc.save()
+		frappe.db.commit()
+		counts = get_user_counts(frappe.session.user, "Moto Demo")
+		self.assertEqual(counts.get("Draft", 0), before.get("Draft", 0))
+		self.assertEqual(counts.get("Active", 0), before.get("Active", 0) + 1)
+
+		doc.delete()
+		frappe.db.commit()
+		counts = get_user_counts(frappe.session.user, "Moto Demo")
+		self.assertEqual(counts.get("Active", 0), before.get("Active", 0))
+
+	def test_partial_counts_are_not_served(self):
+		"""Test that increments skip a missing hash and a hash without the built marker is rebuilt"""
+		key = _counts_key("Moto Demo", frappe.session.user)
+		expected = get_user_counts(frappe.session.user, "Moto Demo")
+		frappe.cache().pipeline().delete(key).execute()
+
+		apply_activity("Moto Demo", {(frappe.session.user, "Draft"): 1})
+		self.assertFalse(frappe.cache().pipeline().exists(key).execute()[0])
+
+		frappe.cache().pipeline().hset(key, "Draft", 1000).execute()
+		self.assertEqual(get_user_counts(frappe.session.user, "Moto Demo"), expected)
+
+	def test_summary_lists_recent_records(self):
+		"""Test that the summary returns the most recently modified records first"""
+		first = self.make_demo("First")
+		second = self.make_demo("Second")
+
+		summary = get_user_demo_summary(limit=5)
+		recent = [row.name for row in summary["recent"]]
+
+		self.assertIn("Moto Demo", summary["counts"])
+		self.assertIn("total", summary["counts"]["Moto Demo"])
+		self.assertIn(second.name, recent)
+		self.assertIn(first.name, recent)
+		self.assertLess(recent.index(second.name), recent.index(first.name))
+
+	def test_other_users_summary_not_permitted(self):
+		"""Test that regular users cannot read another user's summary"""
+		frappe.set_user("Guest")
+		try:
+			with self.assertRaises(frappe.PermissionError):
+				get_user_demo_summary(user="Administrator")
+		finally:
+			frappe.set_user("Administrator")
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,191 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+"""
+Per-user activity index for the demo doctypes
+
+Keeps two structures in Redis so the "my demos" views never scan the tables:
+
+- a hash per (doctype, user) with the number of records the user created, by status
+- a sorted set per user with the records they last modified, scored by modification time
+
+Both are kept current incrementally by the controllers. Counts are rebuilt from the
+(created_by_user, status) index on a cache miss and expire daily so any drift heals itself.
+
+Counters are plain Redis integers, so all commands go through a pipeline instead of
+the RedisWrapper helpers, which pickle hash values.
+"""
+
+from collections import Counter
+from functools import partial
+
+import frappe
+from frappe.utils import cint, get_datetime
+
+from ml_modules.ml_modules.utils import DEMO_DOCTYPES
+
+# number of recently modified records kept per user
+RECENT_ACTIVITY_LIMIT = 100
+
+# counts are rebuilt from the database at least once a day
+COUNTS_TTL = 24 * 60 * 60
+
+# marks a counts hash as built, so users without records are cached too
+BUILT_FIELD = "__built"
+
+# adjusts a count only if the hash is built, so an expired hash is not recreated partially
+INCREMENT_IF_BUILT_SCRIPT = """
+if redis.call("hexists", KEYS[1], ARGV[1]) == 1 then
+	return redis.call("hincrby", KEYS[1], ARGV[2], ARGV[3])
+end
+return false
+"""
+
+
+def on_demo_update(doc):
+	"""Record the count and recent-activity changes of a saved demo"""
+	deltas = Counter()
+	before = doc.get_doc_before_save()
+	if before:
+		deltas[(before.created_by_user, before.status)] -= 1
+	deltas[(doc.created_by_user, doc.status)] += 1
+
+	touched = [(doc.modified_by_user, doc.name, get_datetime(doc.modified).timestamp())]
+	frappe.db.after_commit.add(partial(apply_activity, doc.doctype, deltas, touched))
+
+
+def on_demo_trash(doc):
+	"""Remove a deleted demo from its creator's counts and the recent-activity index"""
+	deltas = Counter({(doc.created_by_user, doc.status): -1})
+	frappe.db.after_commit.add(partial(apply_activity, doc.doctype, deltas))
+	frappe.db.after_commit.add(partial(_forget_recent, doc.doctype, doc.name, doc.modified_by_user))
+
+
+def apply_activity(doctype, deltas, touched=None):
+	"""
+	Apply aggregate count deltas and recent-activity touches in one round trip
+
+	`deltas` maps (user, status) to the change in count, `touched` is a list of
+	(user, name, timestamp) tuples. Counts are only adjusted for hashes that are
+	already built; missing ones are rebuilt from the database on the next read.
+	"""
+	cache = frappe.cache()
+	deltas = {key: delta for key, delta in deltas.items() if key[0] and delta}
+
+	pipe = cache.pipeline()
+	for (user, status), delta in deltas.items():
+		pipe.eval(INCREMENT_IF_BUILT_SCRIPT, 1, _counts_key(doctype, user), BUILT_FIELD, status or "", delta)
+
+	recent_keys = set()
+	for user, name, timestamp in touched or []:
+		if not user:
+			continue
+		pipe.zadd(_recent_key(user), {_member(doctype, name): timestamp})
+		recent_keys.add(_recent_key(user))
+
+	for key in recent_keys:
+		pipe.zremrangebyrank(key, 0, -(RECENT_ACTIVITY_LIMIT + 1))
+
+	pipe.execute()
+
+
+def get_user_counts(user, doctype):
+	"""Return {status: count} of the records `user` created, building the cache on a miss"""
+	cache = frappe.cache()
+	key = _counts_key(doctype, user)
+	cached = {
+		frappe.safe_decode(status): cint(count)
+		for status, count in cache.pipeline().hgetall(key).execute()[0].items()
+	}
+	# a hash without the marker was not written by a rebuild and cannot be trusted
+	if cached.pop(BUILT_FIELD, None):
+		return {status: count for status, count in cached.items() if count}
+
+	# NULL and "" are the same missing status, as in the cached hash
+	counts = Counter()
+	for status, count in frappe.db.sql(
+		f"""
+		SELECT status, COUNT(*)
+		FROM `tab{doctype}`
+		WHERE created_by_user = %s
+		GROUP BY status
+	""",
+		user,
+	):
+		counts[status or ""] += cint(count)
+
+	pipe = cache.pipeline()
+	pipe.delete(key)
+	pipe.hset(key, mapping={BUILT_FIELD: 1, **counts})
+	pipe.expire(key, COUNTS_TTL)
+	pipe.execute()
+	return dict(counts)
+
+
+def get_recent_activity(user, limit=20, since=None):
+	"""Return the records `user` modified most recently, newest first"""
+	min_score = get_datetime(since).timestamp() if since else "-inf"
+	members = (
+		frappe.cache()
+		.pipeline()
+		.zrevrangebyscore(_recent_key(user), "+inf", min_score, start=0, num=cint(limit), withscores=True)
+		.execute()[0]
+	)
+
+	names_by_doctype = {}
+	for member, _score in members:
+		doctype, name = frappe.safe_decode(member).split("::", 1)
+		names_by_doctype.setdefault(doctype, []).append(name)
+
+	# re-read the (at most `limit`) records by primary key so renamed and
+	# deleted records drop out and the status shown is current
+	rows = {}
+	for doctype, names in names_by_doctype.items():
+		for row in frappe.get_all(
+			doctype,
+			filters={"name": ("in", names)},
+			fields=["name", "title", "status", "modified"],
+		):
+			rows[_member(doctype, row.name)] = row.update({"doctype": doctype})
+
+	return [rows[key] for key in (frappe.safe_decode(m) for m, _s in members) if key in rows]
+
+
+@frappe.whitelist()
+def get_user_demo_summary(user=None, limit=20, since=None):
+	"""
+	Return the demo counts by status and the recently modified demos of a user
+
+	Only System Managers can look at other users' summaries.
+	"""
+	user = user or frappe.session.user
+	if user != frappe.session.user and "System Manager" not in frappe.get_roles():
+		frappe.throw("Not permitted to view the activity of other users", frappe.PermissionError)
+
+	counts = {}
+	for doctype in DEMO_DOCTYPES:
+		by_status = get_user_counts(user, doctype)
+		counts[doctype] = {**by_status, "total": sum(by_status.values())}
+
+	return {
+		"user": user,
+		"counts": counts,
+		"recent": get_recent_activity(user, limit=min(cint(limit) or 20, RECENT_ACTIVITY_LIMIT), since=since),
+	}
+
+
+def _forget_recent(doctype, name, user):
+	if user:
+		frappe.cache().pipeline().zrem(_recent_key(user), _member(doctype, name)).execute()
+
+
+def _counts_key(doctype, user):
+	return frappe.cache().make_key(f"ml_modules:demo_counts:{doctype}:{user}")
+
+
+def _recent_key(user):
+	return frappe.cache().make_key(f"ml_modules:demo_recent:{user}")
+
+
+def _member(doctype, name):
+	return f"{doctype}::{name}"
@@ -0,0 +1,23 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+import frappe
+
+DEMO_DOCTYPES = ("Moto Demo", "Lamaa Demo")
+
+# typical engine capacity (cc) per motorcycle type
+ENGINE_CAPACITY_RANGES = {
+	"Sport": {"min": 250, "max": 1000, "typical": "600-1000cc"},
+	"Cruiser": {"min": 500, "max": 1800, "typical": "800-1600cc"},
+	"Touring": {"min": 800, "max": 1800, "typical": "1000-1600cc"},
+	"Naked": {"min": 250, "max": 1000, "typical": "400-800cc"},
+	"Adventure": {"min": 650, "max": 1250, "typical": "800-1200cc"},
+	"Scooter": {"min": 50, "max": 300, "typical": "125-250cc"},
+	"Electric": {"min": 0, "max": 0, "typical": "N/A - Electric motor"},
+}
+
+
+def validate_demo_doctype(doctype):
+	"""Throw if `doctype` is not one of the demo doctypes of this app"""
+	if doctype not in DEMO_DOCTYPES:
+		frappe.throw(f"{doctype} is not a demo doctype")
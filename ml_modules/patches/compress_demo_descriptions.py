@@ -0,0 +1,15 @@
+# Copyright (c) 2024, White Stork and contributors
+# For license information, please see license.txt
+
+from ml_modules.ml_modules.backfill import run_backfill
+from ml_modules.ml_modules.utils import DEMO_DOCTYPES
+
+
+def execute():
+	"""Move the plain description columns of existing demos into Demo Description Blob"""
+	for doctype in DEMO_DOCTYPES:
+		run_backfill(
+			doctype,
+			"ml_modules.ml_modules.description_store.compress_descriptions",
+			job_name=f"{doctype}: compress descriptions",
+		)